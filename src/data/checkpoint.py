@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+
+
+def fsync_path(path:str):
+    """Flushes a file or folder to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError: # some platforms (e.g. windows) cannot fsync folders
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_json_atomic(path:str, obj):
+    """Writes obj as a json file that is either completely replaced or not at all.
+
+    The content is written to a temporary file and flushed to disk before it is renamed to path;
+    the rename itself is made durable by flushing the folder.
+
+    Args:
+        path (str): path of the json file
+        obj (object): json serialisable object
+    """
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(obj, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f'{path}.tmp', path)
+    fsync_path(os.path.dirname(os.path.abspath(path)))
+
+
+class Checkpoint:
+    """Crash-safe progress of a collection.
+
+    The period of a collection is split into partitions (e.g. days). For every partition the checkpoint
+    records the number of saved tweets, the cursor after the last saved page and whether the partition
+    is complete; a running counter holds the total number of saved tweets, so the progress never has to be
+    computed from the collected data and a collection can be resumed in the middle of a partition.
+    A commit appends the new state of its partition as a line to a journal next to the checkpoint file
+    (e.g. checkpoint.jsonl for checkpoint.json) and flushes it to disk, instead of rewriting the progress of all
+    partitions. Every COMPACT_INTERVAL commits, and when compact is called, the journal is moved into the json
+    file, which is replaced atomically. A journal line holds the state of a partition and not a difference,
+    so lines that are already contained in the json file after an interrupted compaction do no harm.
+
+    A commit should follow the save of the tweets it records. If the process is killed in between,
+    the tweets of that batch are collected again after the restart.
+
+    Attributes:
+        path: path to the checkpoint file
+        journal_path: path to the journal of the commits since the last compaction
+        params: json serialisable parameters of the collection (e.g. query string and period)
+    """
+    COMPACT_INTERVAL = 1000
+
+    def __init__(self, path:str, params:dict=None) -> None:
+        self.path = path
+        self.journal_path = f'{os.path.splitext(path)[0]}.jsonl'
+        self._lock = threading.Lock()
+        self._saved = os.path.isfile(path)
+        if self._saved:
+            with open(path, encoding='utf-8') as f:
+                self._state = json.load(f)
+        else:
+            self._state = {'params': params or {}, 'tweets': 0, 'partitions': {}}
+        self._journal_offset = 0
+        self._journal_lines = 0
+        self._read_journal()
+
+    def progress(self, partition:str):
+        """Returns the number of saved tweets and the cursor to resume a partition with.
+
+        Args:
+            partition (str): name of the partition, e.g. the day '%Y-%m-%d'
+
+        Returns:
+            tweets (int): number of tweets saved for the partition
+            cursor: position after the last saved page; None if the partition has not been started
+        """
+        with self._lock:
+            state = self._state['partitions'].get(partition, {})
+            return state.get('tweets', 0), state.get('cursor')
+
+    def is_complete(self, partition:str):
+        """Checks whether all tweets of a partition have been saved."""
+        with self._lock:
+            return self._state['partitions'].get(partition, {}).get('complete', False)
+
+    def commit(self, partition:str, tweets:int, cursor=None, complete:bool=False):
+        """Records saved tweets of a partition in the journal.
+
+        Args:
+            partition (str): name of the partition, e.g. the day '%Y-%m-%d'
+            tweets (int): number of tweets saved since the last commit of the partition
+            cursor (optional): json serialisable position after the saved tweets
+            complete (bool, optional): the partition is complete
+        """
+        with self._lock:
+            state = dict(self._state['partitions'].get(partition, {'tweets': 0}))
+            state['tweets'] += tweets
+            state['cursor'] = cursor
+            state['complete'] = complete
+            if not self._saved: # the json file holds the parameters of the collection
+                write_json_atomic(self.path, self._state)
+                self._saved = True
+            line = (json.dumps({'partition': partition, **state}) + '\n').encode('utf-8')
+            with open(self.journal_path, 'ab') as f:
+                f.truncate(self._journal_offset) # cut off an incomplete line of an interrupted commit
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_offset += len(line)
+            self._journal_lines += 1
+            self._apply(partition, state)
+            if self._journal_lines >= self.COMPACT_INTERVAL:
+                self._compact()
+
+    def compact(self):
+        """Moves the journal into the checkpoint file, e.g. when a collection is finished."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        write_json_atomic(self.path, self._state)
+        self._saved = True
+        if os.path.isfile(self.journal_path):
+            os.remove(self.journal_path)
+            fsync_path(os.path.dirname(os.path.abspath(self.journal_path)))
+        self._journal_offset = 0
+        self._journal_lines = 0
+
+    def _read_journal(self):
+        if not os.path.isfile(self.journal_path):
+            return
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break # incomplete line of an interrupted commit
+                state = json.loads(line)
+                self._apply(state.pop('partition'), state)
+                self._journal_offset += len(line)
+                self._journal_lines += 1
+
+    def _apply(self, partition:str, state:dict):
+        self._state['tweets'] += state['tweets'] - self._state['partitions'].get(partition, {}).get('tweets', 0)
+        self._state['partitions'][partition] = state
+
+    def __get_params(self):
+        return dict(self._state['params'])
+
+    def __get_num_tweets(self):
+        return self._state['tweets']
+
+    def __get_completed_partitions(self):
+        with self._lock:
+            return [partition for partition, state in self._state['partitions'].items() if state['complete']]
+
+    params = property(__get_params)
+    num_tweets = property(__get_num_tweets)
+    completed_partitions = property(__get_completed_partitions)
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+
+from src.data.tweet_batch import TweetBatch
+
+
+_STATUS_ID_PATTERN = re.compile(r'/status(?:es)?/(\d+)(?:[/?#]|$)')
+
+
+def tweet_id(url:str):
+    """Returns the numeric id of a tweet url; urls without an id are hashed to a 64 bit integer."""
+    match = _STATUS_ID_PATTERN.search(url)
+    if match:
+        return int(match.group(1))
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+class DuplicateFilter:
+    """Removes tweets that were already collected before they are saved.
+
+    The filter is keyed on the tweet id of the url. The ids of the saved tweets are kept in memory as a
+    sorted int64 array and persisted in an append-only file of int64 values, so the filter survives
+    a restart of the collection. Ids of tweets that passed the filter but are not saved yet are pending;
+    they are only written to the file by commit, i.e. after the tweets have been saved, and are released
+    by discard if the tweets are not saved (e.g. before a retry). One filter can be shared by several threads.
+
+    Attributes:
+        path: path to the id file; None keeps the filter in memory only
+        duplicates: number of tweets removed by the filter
+    """
+    _MERGE_SIZE = 65536 # number of committed ids that are merged into the sorted array at once
+
+    def __init__(self, path:str=None) -> None:
+        self.path = path
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        self._ids = np.empty(0, dtype=np.int64)
+        self._committed_ids = set()
+        self._pending_ids = set()
+        if path is not None and os.path.isfile(path):
+            self._ids = np.unique(self._read_ids(path))
+
+    def filter(self, tweets:list):
+        """Returns the tweets that have not been collected before.
+
+        Duplicates within tweets are removed as well. The returned tweets are pending until they are committed or discarded.
+
+        Args:
+            tweets (list): list of Tweet objects
+
+        Returns:
+            new_tweets (list): list of the new Tweet objects
+        """
+        if not tweets:
+            return []
+        ids = np.fromiter((tweet_id(tweet.url) for tweet in tweets), dtype=np.int64, count=len(tweets))
+        new_tweets = []
+        with self._lock:
+            known = self._contains(ids)
+            for tweet, key, is_known in zip(tweets, ids.tolist(), known.tolist()):
+                if is_known or key in self._committed_ids or key in self._pending_ids:
+                    self.duplicates += 1
+                    continue
+                self._pending_ids.add(key)
+                new_tweets.append(tweet)
+        return new_tweets
+
+    def commit(self, tweets):
+        """Persists the ids of saved tweets (a TweetBatch or list); should be called after the tweets have been saved."""
+        if not len(tweets):
+            return
+        ids = np.fromiter((tweet_id(url) for url in _urls(tweets)), dtype=np.int64, count=len(tweets))
+        with self._lock:
+            if self.path is not None:
+                with open(self.path, 'ab') as f:
+                    f.write(ids.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            keys = set(ids.tolist())
+            self._pending_ids -= keys
+            self._committed_ids |= keys
+            if len(self._committed_ids) >= self._MERGE_SIZE:
+                self._merge()
+
+    def discard(self, tweets):
+        """Releases the ids of filtered tweets (a TweetBatch or list) that were not saved, so they can be collected again."""
+        if not len(tweets):
+            return
+        keys = {tweet_id(url) for url in _urls(tweets)}
+        with self._lock:
+            self._pending_ids -= keys
+
+    def _contains(self, ids:np.ndarray):
+        positions = np.searchsorted(self._ids, ids)
+        positions[positions == len(self._ids)] = 0
+        return self._ids[positions] == ids if len(self._ids) else np.zeros(len(ids), dtype=bool)
+
+    def _merge(self):
+        committed_ids = np.fromiter(self._committed_ids, dtype=np.int64, count=len(self._committed_ids))
+        self._ids = np.union1d(self._ids, committed_ids)
+        self._committed_ids = set()
+
+    @staticmethod
+    def _read_ids(path:str):
+        # an interrupted commit can leave an incomplete id at the end of the file, which is cut off
+        count = os.path.getsize(path) // 8
+        with open(path, 'r+b') as f:
+            f.truncate(count * 8)
+        return np.fromfile(path, dtype=np.int64, count=count)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids) + len(self._committed_ids) + len(self._pending_ids)
+
+
+def _urls(tweets):
+    if isinstance(tweets, TweetBatch):
+        return tweets.column('url')
+    return [tweet.url for tweet in tweets]
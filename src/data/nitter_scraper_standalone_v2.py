@@ -1,12 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 import datetime
 import time
 import pickle
-import os
 import argparse
 import logging
+import os
+import threading
 import urllib.parse
 
+import urllib3 # installed with selenium
+
 # import dependencies: selenium, bs4 & tqdm
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -14,10 +18,28 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import selenium
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+try:
+    import lxml # optional; faster html parser for bs4
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+
+def _has_class(name:str):
+    # while a page is parsed with parse_only, bs4 compares the raw class attribute (e.g. 'timeline-item thread'),
+    # so class_=name would only match elements whose class attribute is exactly name
+    return lambda value: value is not None and name in value.split()
 
 from tqdm import tqdm
 
+from src.data.checkpoint import Checkpoint
+from src.data.duplicate_filter import DuplicateFilter
+from src.data.rate_limiting import AdaptiveRateLimiter
+from src.data.sources import TweetSource
+from src.data.tweet_batch import TweetBatch
+from src.data.tweet_store import TweetStore
+
 
 # - Exception classes
 class TwitterAPIEndpointError(Exception):
@@ -26,6 +48,9 @@ class TwitterAPIEndpointError(Exception):
 class NextPageNotFound(Exception):
     """Raises when no other page with tweets can be found for the current search parameters"""
 
+class PageRequestError(Exception):
+    """Raises when a page of a started search cannot be requested; the search can be continued from the last cursor"""
+
 
 # - Data classes
 @dataclass
@@ -35,96 +60,175 @@ class Tweet:
     date:str
     rawContent:str
 
+_TWEET_FIELDS = {'url': 'string', 'date': 'string', 'rawContent': 'string'} # columns of a TweetBatch of nitter tweets
 
-class TweetScraper():
+
+class TweetScraper(TweetSource):
     """Web scraper for the nitter.net website
     
     A scraper that can collect and save Twitter posts from nitter.net
 
     Attributes:
-        ratelimit: limits the request speed (in seconds)
+        ratelimit: initial time between two requests (in seconds); adapted by the rate limiter
+        source: optional TweetSource (e.g. a ReplaySource) that is used instead of the browser
+        fast_parser: only parse the timeline items of a page, with lxml if installed
+        parse_failures: number of timeline items that could not be parsed
+        rate_limiter: AdaptiveRateLimiter; can be shared with other scrapers
+        retries: number of times a page is reloaded if the next page cannot be found
     """
-    def __init__(self, ratelimit=0.5) -> None:
+    def __init__(self, ratelimit=0.5, source:TweetSource=None, fast_parser:bool=True,
+                 rate_limiter:AdaptiveRateLimiter=None, retries:int=1) -> None:
         self.ratelimit = ratelimit
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(rate=1 / ratelimit if ratelimit else None)
+        self.retries = retries
+        self.source = source
+        self.fast_parser = fast_parser
+        self.parse_failures = 0
         self.__id = int(datetime.datetime.now().timestamp())
-        self.driver = webdriver.Firefox() # Warning: Selected browser must be installed on the system!
+        self._store = None
+        if source is None:
+            self.driver = webdriver.Firefox() # Warning: Selected browser must be installed on the system!
         self._base_url = 'https://nitter.net/search?f=tweets'
 
-    def collect_tweets(self, nitter_html_source):
+    @staticmethod
+    def parse_tweets(nitter_html_source, fast_parser:bool=True):
         """Parses HTML source for Twitter data.
 
         Uses bs4 to search the HTML source for the relevant data. 
-        The data found are added to a list as Tweets. Finally, the tweets are saved in a file.
         
         Args:
             nitter_html_source: webdriver.page_source object
+            fast_parser: only parse the timeline items of the page, with lxml if installed
 
         Returns:
-            list_of_collected_tweets: list of collected tweets
+            list_of_collected_tweets: list of Tweets found on the page
         """
-        soup = BeautifulSoup(nitter_html_source, 'html.parser')
-        tweet_containers = soup.find_all("div", class_="timeline-item")
+        return parse_nitter_page(nitter_html_source, fast_parser)[0]
 
-        list_of_collected_tweets = []
-        for tweet in tweet_containers:
-            try:
-                tweet_url = f"https://twitter.com{tweet.find('a', class_='tweet-link')['href']}"
-                tweet_date = tweet.find('span', class_='tweet-date').find('a')['title']
-                tweet_content = tweet.find('div', class_='tweet-content').text.strip()
+    def collect_tweets(self, nitter_html_source):
+        """Parses HTML source for Twitter data.
 
-                _ = Tweet(tweet_url, tweet_date, tweet_content)
-                
-                list_of_collected_tweets.append(_)
-            except:
-                pass
+        The tweets found on the page are saved in a file.
+        
+        Args:
+            nitter_html_source: webdriver.page_source object
 
+        Returns:
+            list_of_collected_tweets: list of collected tweets
+        """
+        list_of_collected_tweets = self.__parse(nitter_html_source)
         self.__save_collected_tweets(list_of_collected_tweets)
         return list_of_collected_tweets
 
-    def search(self, q:str, since:datetime.datetime, until:datetime.datetime, limit:int):
+    def iter_tweets(self, querystring:str, since:datetime.datetime, until:datetime.datetime):
+        """Returns an iterator of the tweets on the nitter pages for the search parameters.
+
+        Pages are parsed on a separate thread, so the browser already loads the next page
+        while the current one is parsed.
+
+        Args:
+            querystring: search string (url encoded)
+            since: start time of the search
+            until: end time of the search
+        """
+        # load first page in driver browser
+        start_page = self._base_url + f'&q={querystring}&since={str(since.date())}&until={str(until.date())}&near='
+        self.driver.get(start_page)
+        with ThreadPoolExecutor(max_workers=1) as parser:
+            parsed_page = None
+            failed_attempts = 0
+            while True:
+                self.rate_limiter.acquire()
+                if failed_attempts:
+                    self.driver.refresh()
+                request_time = time.monotonic()
+                try:
+                    # preload next nitter page and parse tweets on current page
+                    nitter_html_source = self.__request_next_nitter_site()
+                except NextPageNotFound:
+                    # the page did not load completely, e.g. because the instance is rate limited
+                    if failed_attempts >= self.retries:
+                        break
+                    failed_attempts += 1
+                    backoff = self.rate_limiter.failure()
+                    logging.warning(f'next page not found; reload page in {round(backoff, 1)} s')
+                    continue
+                self.rate_limiter.success(latency=time.monotonic() - request_time)
+                failed_attempts = 0
+                next_parsed_page = parser.submit(self.__parse, nitter_html_source)
+                if self.next_page is not None:
+                    self.next_page.click() # go to the next nitter page
+                if parsed_page is not None:
+                    yield from parsed_page.result()
+                parsed_page = next_parsed_page
+                if self.next_page is None: # last page of the search
+                    break
+            if parsed_page is not None:
+                yield from parsed_page.result()
+
+    def search(self, q:str, since:datetime.datetime, until:datetime.datetime, limit:int, save_interval:int=20,
+               checkpoint:Checkpoint=None, partition:str=None, duplicate_filter:DuplicateFilter=None):
         """Search for tweets that match the search parameters.
 
         The search continues until the number of tweets specified in limit has been collected.
         Note: Depending on the search parameters, it may happen that the requested number of tweets is not collected.
+        With a checkpoint, every save is committed together with the cursor of the last saved page and the
+        search continues after the last committed page of the partition.
+        With a duplicate filter, tweets that were already collected are dropped and do not count towards the limit.
 
         Args:
             q: search string (url encoded)
             since: start time of the search
             until: end time of the search
             limit: number of tweets to collect
+            save_interval: number of tweets saved at once
+            checkpoint: optional Checkpoint that records the progress of the search
+            partition: name of the search in the checkpoint
+            duplicate_filter: optional DuplicateFilter shared by all searches of a collection
         """
-        # load first page in driver browser
-        start_page = self._base_url + f'&q={q}&since={str(since.date())}&until={str(until.date())}&near='
-        self.driver.get(start_page)
+        source = self.source or self
+        number_of_collected_tweets, cursor = checkpoint.progress(partition) if checkpoint else (0, None)
 
         # collect tweets until limit reached
-        number_of_collected_tweets = 0
-        with tqdm(total=limit, leave=False) as pbar:
-            while number_of_collected_tweets <= limit:
+        list_of_collected_tweets = TweetBatch(_TWEET_FIELDS)
+        complete = True
+        with tqdm(total=limit, initial=number_of_collected_tweets, leave=False) as pbar:
+            if number_of_collected_tweets < limit:
                 try:
-                    time.sleep(self.ratelimit) # ratelimit
-                    # preload next nitter page and collect tweets on current page
-                    collected_tweets = self.collect_tweets(nitter_html_source=self.__request_next_nitter_site())
-                except NextPageNotFound:
-                    logging.warning('The requested number of tweets could not be collected completely (NextPageNotFound)')
-                    break
-                number_of_collected_tweets += len(collected_tweets)
-                pbar.update(len(collected_tweets))
-                self.next_page.click() # go to the next nitter page
+                    for page, cursor in source.iter_pages(q, since, until, cursor):
+                        if duplicate_filter is not None:
+                            page = duplicate_filter.filter(page)
+                        list_of_collected_tweets.extend(page)
+                        number_of_collected_tweets += len(page)
+                        pbar.update(len(page))
+                        if len(list_of_collected_tweets) >= save_interval:
+                            self.__save_collected_tweets(list_of_collected_tweets, checkpoint, partition, cursor, cursor is None, duplicate_filter)
+                            list_of_collected_tweets = TweetBatch(_TWEET_FIELDS)
+                        if number_of_collected_tweets >= limit:
+                            break
+                    else:
+                        logging.warning('The requested number of tweets could not be collected completely (NextPageNotFound)')
+                except PageRequestError as e:
+                    # cursor is still the cursor of the last page that was received; the search is continued there
+                    logging.warning(f'{e}; the search is stopped and can be continued later')
+                    complete = False
+            self.__save_collected_tweets(list_of_collected_tweets, checkpoint, partition, cursor, complete, duplicate_filter)
             pbar.close()
 
     @staticmethod
     def load_collected_tweets(path):
-        """Load serialized Tweet objects.
+        """Load collected Tweet objects.
 
-        The serialized Tweet objects within the file are returned as a list.
+        The Tweet objects within the TweetStore folder (or a .pkl file of older versions) are returned as a list.
 
         Args:
-            path: path to .pkl file
+            path: path to the TweetStore folder or .pkl file
 
         Returns:
             tweets: list of Tweet objects
         """
+        if TweetStore.is_store(path):
+            return [Tweet(**row) for row in TweetStore(path).to_table().to_pylist()]
         tweets = []
         with open(path, 'rb') as f:
             while True:
@@ -136,25 +240,42 @@ class TweetScraper():
         return tweets
            
     def __request_next_nitter_site(self):
-        # preload next nitter page
+        # preload next nitter page; the last page has no 'show-more' link but the end of the timeline
+        # (or the note that nothing was found) instead; self.next_page is None on the last page
         try:
-            self.next_page = WebDriverWait(self.driver, 10).until(EC.presence_of_element_located((By.XPATH, '//div[@class="show-more"]')))
+            element = WebDriverWait(self.driver, 10).until(EC.any_of(
+                EC.presence_of_element_located((By.XPATH, '//div[@class="show-more"]')),
+                EC.presence_of_element_located((By.XPATH, '//h2[@class="timeline-end" or @class="timeline-none"]'))
+            ))
         except selenium.common.exceptions.TimeoutException:
             raise NextPageNotFound
+        self.next_page = element if element.tag_name == 'div' else None
         # return current html source
         nitter_html_source = self.driver.page_source
         return nitter_html_source
 
-    def __save_collected_tweets(self, list_of_collected_tweets):
-        # creates required folders
-        path = f'./.nss/{self.id}'
-        if not os.path.exists(path):
-            os.makedirs(path)
-        # save every tweet in list_of_collected_tweets
-        for tweet in list_of_collected_tweets:
-            with open(f'{path}/data.pkl', 'ab') as f:
-                pickle.dump(tweet, f)
+    def __parse(self, nitter_html_source):
+        list_of_collected_tweets, failures = parse_nitter_page(nitter_html_source, self.fast_parser)
+        if failures:
+            self.parse_failures += failures
+            logging.warning(f'{failures} timeline items could not be parsed ({self.parse_failures} in total)')
+        return list_of_collected_tweets
 
+    def __save_collected_tweets(self, list_of_collected_tweets, checkpoint=None, partition=None, cursor=None, complete=False,
+                                duplicate_filter=None):
+        # append list_of_collected_tweets as a new segment; creates required folders
+        self.__get_store().append(list_of_collected_tweets, label=partition)
+        if duplicate_filter is not None:
+            duplicate_filter.commit(list_of_collected_tweets)
+        if checkpoint is not None:
+            checkpoint.commit(partition, len(list_of_collected_tweets), cursor, complete)
+
+
+    def __get_store(self):
+        # the store is kept, so the segment list is not read again for every save
+        if self._store is None or self._store.path != f'./.nss/{self.id}/data':
+            self._store = TweetStore(f'./.nss/{self.id}/data')
+        return self._store
 
     def __get_id(self):
         return self.__id
@@ -165,11 +286,154 @@ class TweetScraper():
     id = property(__get_id, __set_id)
 
 
+def parse_nitter_page(nitter_html_source, fast_parser:bool=True):
+    """Parses a nitter page for Twitter data.
+
+    Args:
+        nitter_html_source: html source of the page
+        fast_parser: only parse the timeline items of the page, with lxml if installed
+
+    Returns:
+        list_of_collected_tweets: list of Tweets found on the page
+        failures: number of timeline items that could not be parsed
+    """
+    if fast_parser:
+        soup = BeautifulSoup(nitter_html_source, HTML_PARSER, parse_only=SoupStrainer('div', class_=_has_class('timeline-item')))
+    else:
+        soup = BeautifulSoup(nitter_html_source, 'html.parser')
+    tweet_containers = soup.find_all("div", class_="timeline-item")
+
+    list_of_collected_tweets = []
+    failures = 0
+    for tweet in tweet_containers:
+        if 'show-more' in tweet.get('class', []):
+            continue # 'load newest' link at the top of the timeline
+        try:
+            tweet_url = f"https://twitter.com{tweet.find('a', class_='tweet-link')['href']}"
+            tweet_date = tweet.find('span', class_='tweet-date').find('a')['title']
+            tweet_content = tweet.find('div', class_='tweet-content').text.strip()
+        except (AttributeError, KeyError, TypeError): # required element or attribute is missing
+            failures += 1
+            continue
+        list_of_collected_tweets.append(Tweet(tweet_url, tweet_date, tweet_content))
+    return list_of_collected_tweets, failures
+
+
+class HttpNitterSource(TweetSource):
+    """Searches nitter.net with plain http requests instead of a browser.
+
+    Follows the cursor link of the 'show-more' element from page to page. The connections are pooled
+    and kept alive, responses are gzip compressed and failed requests are retried after a backoff.
+    The source can be shared by several threads, each following the cursor of another day; all threads
+    share the rate limiter, which pauses them after errors (e.g. HTTP 429 or timeouts).
+    If the first page of a search cannot be fetched (e.g. because of a browser check), the search falls
+    back to the selenium TweetScraper.
+
+    Attributes:
+        base_url: url of the nitter instance
+        ratelimit: initial time between two requests (in seconds); adapted by the rate limiter
+        rate_limiter: AdaptiveRateLimiter; can be shared with other sources
+        retries: number of times a failed request is repeated
+        timeout: timeout of a request (in seconds)
+        fallback: fall back to selenium if the first page cannot be fetched
+        fast_parser: only parse the timeline items of a page, with lxml if installed
+        parse_failures: number of timeline items that could not be parsed
+    """
+    def __init__(self, base_url:str='https://nitter.net', ratelimit:float=0.5, rate_limiter:AdaptiveRateLimiter=None,
+                 retries:int=3, timeout:float=30.0, maxsize:int=10, fallback:bool=True, fast_parser:bool=True) -> None:
+        self.base_url = base_url
+        self.ratelimit = ratelimit
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(rate=1 / ratelimit if ratelimit else None)
+        self.retries = retries
+        self.timeout = timeout
+        self.fallback = fallback
+        self.fast_parser = fast_parser
+        self.parse_failures = 0
+        self._lock = threading.Lock()
+        headers = urllib3.make_headers(keep_alive=True, accept_encoding=True, user_agent='Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/115.0')
+        # retries are handled by fetch, so that the rate limiter can adapt to every error
+        self.http = urllib3.PoolManager(num_pools=4, maxsize=maxsize, block=True, headers=headers, retries=False)
+
+    def fetch(self, url:str):
+        """Returns the html source of url; raises urllib3.exceptions.HTTPError if the request fails."""
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.acquire()
+            request_time = time.monotonic()
+            try:
+                response = self.http.request('GET', url, timeout=self.timeout)
+            except urllib3.exceptions.HTTPError as e: # e.g. timeouts and connection errors
+                error = e
+            else:
+                if response.status == 200:
+                    self.rate_limiter.success(latency=time.monotonic() - request_time)
+                    return response.data.decode('utf-8', errors='replace')
+                error = urllib3.exceptions.HTTPError(f'{url} returned status {response.status}')
+                if response.status not in (429, 500, 502, 503, 504):
+                    raise error
+            backoff = self.rate_limiter.failure()
+            if attempt < self.retries:
+                logging.warning(f'request failed ({error}); retry {attempt+1}/{self.retries} in {round(backoff, 1)} s')
+        raise error
+
+    def iter_tweets(self, querystring:str, since:datetime.datetime, until:datetime.datetime):
+        try:
+            for list_of_collected_tweets, _ in self.iter_pages(querystring, since, until):
+                yield from list_of_collected_tweets
+        except PageRequestError as e:
+            logging.warning(f'{e}; the search is stopped')
+
+    def iter_pages(self, querystring:str, since:datetime.datetime, until:datetime.datetime, cursor=None):
+        """Returns an iterator of the pages of a search; the cursor is the url of the next page (None after the last page).
+
+        Raises PageRequestError if a page after the first one cannot be fetched.
+        """
+        if isinstance(cursor, int): # the search was started with the browser, which counts the returned tweets
+            yield from self._iter_pages_with_browser(querystring, since, until, cursor)
+            return
+        url = cursor or f'{self.base_url}/search?f=tweets&q={querystring}&since={str(since.date())}&until={str(until.date())}&near='
+        first_page = cursor is None
+        visited_urls = set()
+        while url is not None and url not in visited_urls:
+            visited_urls.add(url)
+            try:
+                nitter_html_source = self.fetch(url)
+            except urllib3.exceptions.HTTPError as e:
+                if first_page and self.fallback:
+                    logging.warning(f'http request failed ({e}); fall back to selenium')
+                    yield from self._iter_pages_with_browser(querystring, since, until)
+                    return
+                raise PageRequestError(f'http request failed ({e})') from e
+            first_page = False
+            list_of_collected_tweets, failures = parse_nitter_page(nitter_html_source, self.fast_parser)
+            if failures:
+                with self._lock:
+                    self.parse_failures += failures
+            url = self._next_page_url(nitter_html_source)
+            yield list_of_collected_tweets, url
+
+    def _next_page_url(self, nitter_html_source):
+        # the 'show-more' element with a cursor links to the next page ('load newest' has no cursor)
+        soup = BeautifulSoup(nitter_html_source, HTML_PARSER, parse_only=SoupStrainer('div', class_=_has_class('show-more')))
+        links = [div.find('a', href=True) for div in soup.find_all('div', class_='show-more')]
+        links = [link['href'] for link in links if link is not None and 'cursor=' in link['href']]
+        if not links:
+            return None
+        return urllib.parse.urljoin(f'{self.base_url}/search', links[-1])
+
+    def _iter_pages_with_browser(self, querystring, since, until, cursor=None):
+        scraper = TweetScraper(ratelimit=self.ratelimit, fast_parser=self.fast_parser, rate_limiter=self.rate_limiter)
+        try:
+            yield from scraper.iter_pages(querystring, since, until, cursor)
+        finally:
+            scraper.driver.quit()
+
+
 class RecoveryFile():
-    """Manages the recovery file.
+    """Manages the recovery file of older versions.
 
     Contains static methods to manage the .recovery file. 
-    This can be used to continue the script where it left off
+    This can be used to continue the script where it left off.
+    Note: New collections record their progress in a Checkpoint (checkpoint.json) instead.
     """
     @staticmethod
     def read(path):
@@ -185,42 +449,60 @@ class RecoveryFile():
             pickle.dump(recovery_data, f)
 
 
-def scrape(q:str, since:datetime.datetime, until:datetime.datetime, limit:int, id=None):
+def scrape(q:str, since:datetime.datetime, until:datetime.datetime, limit:int, id=None, source:TweetSource=None,
+           http:bool=False, workers:int=1):
     """Collects tweets over a period of time
 
     Collects the required number of tweets between the start and end times each day to reach the limit.
+    The progress is recorded in the checkpoint './.nss/<id>/checkpoint.json'; calling scrape again with the
+    same id skips the completed days and continues the started days after their last saved page.
+    Tweets that were already collected (e.g. repeated by the pagination) are dropped before they are saved.
 
     Args:
         q: search string (url encoded)
         since: start time of the search
         until: end time of the search
         limit: number of tweets to collect    
+        id: id of the collection; a new collection is started if it has no checkpoint
+        source: optional TweetSource that is used instead of the browser
+        http: use a HttpNitterSource instead of the browser
+        workers: number of days collected concurrently; requires a source (e.g. http=True)
     """
-    ts = TweetScraper()
+    if http and source is None:
+        source = HttpNitterSource()
+    if workers > 1 and source is None:
+        raise ValueError('concurrent collection requires a TweetSource, e.g. http=True')
+    ts = TweetScraper(source=source)
     if id:
         ts.id = id
+    os.makedirs(f'./.nss/{ts.id}', exist_ok=True)
+    checkpoint = Checkpoint(
+        path=f'./.nss/{ts.id}/checkpoint.json',
+        params={'id': ts.id, 'q': q, 'since': since.strftime('%Y-%m-%d'), 'until': until.strftime('%Y-%m-%d'), 'limit': limit}
+    )
+    duplicate_filter = DuplicateFilter(f'./.nss/{ts.id}/tweet_ids.bin')
     number_of_tweets_per_day = limit // ((until - since).days)
-    iteration_date = until
-    while iteration_date > since:
+    iteration_dates = [until - datetime.timedelta(days=i) for i in range((until - since).days)]
+    iteration_dates = [date for date in iteration_dates if not checkpoint.is_complete(date.strftime('%Y-%m-%d'))]
+
+    def _scrape_day(iteration_date):
         logging.info(f'\ncollect ~ {number_of_tweets_per_day} tweets : {iteration_date - datetime.timedelta(days=1)} - {iteration_date}')
         ts.search(
             q=q,
             since=iteration_date - datetime.timedelta(days=1),
             until=iteration_date,
-            limit=number_of_tweets_per_day
-        )
-        logging.info('tweet collection is complete!')
-        iteration_date -= datetime.timedelta(days=1)
-        logging.info('update recovery file')
-        RecoveryFile.write(
-            path=f'./.nss/{ts.id}/.recovery', 
-            recovery_data={'id': ts.id, 
-                           'q': q, 
-                           'since': since, 
-                           'until': iteration_date, 
-                           'limit': limit - len(ts.load_collected_tweets(path=f'./.nss/{ts.id}/data.pkl'))}
+            limit=number_of_tweets_per_day,
+            checkpoint=checkpoint,
+            partition=iteration_date.strftime('%Y-%m-%d'),
+            duplicate_filter=duplicate_filter
         )
-        logging.info('Done.')
+        logging.info(f'tweet collection is complete! ({checkpoint.num_tweets} tweets in total)')
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_scrape_day, iteration_dates))
+    TweetStore(f'./.nss/{ts.id}/data').compact()
+    checkpoint.compact()
+    logging.info(f'Done. ({duplicate_filter.duplicates} duplicates removed)')
 
 
 if __name__ == '__main__':
@@ -270,7 +552,12 @@ Are these entries correct? (y/n): '''
         recovery_parser, recovery_unknown = recovery_parser.parse_known_args(unknown)
 
         logging.info('load parameters from recovery file')
-        params = RecoveryFile.read(recovery_parser.path)
+        if recovery_parser.path.endswith('.json'):
+            params = Checkpoint(recovery_parser.path).params
+            params['since'] = datetime.datetime.strptime(params['since'], '%Y-%m-%d')
+            params['until'] = datetime.datetime.strptime(params['until'], '%Y-%m-%d')
+        else:
+            params = RecoveryFile.read(recovery_parser.path)
         logging.info('parameters loaded successfully. continue scraping...')
         scrape(q=params['q'], since=params['since'], until=params['until'], limit=params['limit'], id=params['id'])
 
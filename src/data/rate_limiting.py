@@ -0,0 +1,85 @@
+import random
+import threading
+import time
+
+
+class AdaptiveRateLimiter:
+    """Token bucket rate limiter that adapts its rate to the responses of the service.
+
+    All collection workers share one limiter and call acquire before every request. The rate is
+    adapted AIMD-style: every successful request increases it additively, every error (e.g. HTTP 429,
+    timeouts, missing pages) and every slow response decreases it multiplicatively. After an error
+    all workers pause for a jittered, exponentially growing backoff time.
+
+    Attributes:
+        rate: current number of requests per second; None disables the limit (backoff still applies)
+        min_rate: lower bound of the rate
+        max_rate: upper bound of the rate
+        burst: maximum number of requests that can be sent at once
+        increase: rate increase per successful request
+        decrease: factor the rate is multiplied with after an error
+        latency_threshold: responses slower than this (in seconds) count as congestion
+        base_backoff: backoff time after the first error (in seconds)
+        max_backoff: upper bound of the backoff time (in seconds)
+    """
+    def __init__(self, rate:float=2.0, min_rate:float=0.05, max_rate:float=10.0, burst:int=1, increase:float=0.05,
+                 decrease:float=0.5, latency_threshold:float=10.0, base_backoff:float=1.0, max_backoff:float=300.0) -> None:
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_threshold = latency_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.consecutive_failures = 0
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until the next request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self.rate is None:
+                    return
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+                    self._last_refill = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def success(self, latency:float=None):
+        """Reports a successful request; slow responses reduce the rate like errors, but without backoff."""
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.rate is None:
+                return
+            if latency is not None and latency > self.latency_threshold:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def failure(self):
+        """Reports a failed request; reduces the rate and pauses all workers.
+
+        Returns:
+            backoff (float): the backoff time in seconds
+        """
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.rate is not None:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._tokens = min(self._tokens, 0.0)
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.consecutive_failures - 1))
+            backoff *= random.uniform(0.5, 1.5) # jitter, so that the workers do not retry at the same time
+            self._blocked_until = max(self._blocked_until, time.monotonic() + backoff)
+            return backoff
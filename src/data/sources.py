@@ -0,0 +1,131 @@
+import datetime
+import os
+import shutil
+import tempfile
+import time
+
+from src.data.tweet_store import TweetStore
+from src.utils import logger
+
+
+class TweetSource:
+    """A superclass for sources of tweets.
+
+    A source searches tweets for a query string and a period of time and returns them as an
+    iterator of Tweet objects. The collection loops of the scrapers only consume this iterator,
+    so the backend can be swapped, e.g. for a replay of recorded pages.
+    """
+    def iter_tweets(self, querystring:str, since:datetime.datetime, until:datetime.datetime):
+        """Returns an iterator of the tweets matching the search parameters.
+
+        Args:
+            querystring (str): query string to use to search for tweets
+            since (datetime.datetime): start time
+            until (datetime.datetime): end time
+        """
+        raise NotImplementedError
+
+    def iter_pages(self, querystring:str, since:datetime.datetime, until:datetime.datetime, cursor=None):
+        """Returns an iterator of pages of tweets together with the cursor to resume the search after each page.
+
+        The cursor of this default implementation is the number of tweets read so far, i.e. a resumed
+        search skips the tweets that were already returned. Sources that can continue a search at a
+        certain page (e.g. with a pagination link) override this method.
+
+        Args:
+            querystring (str): query string to use to search for tweets
+            since (datetime.datetime): start time
+            until (datetime.datetime): end time
+            cursor (optional): cursor of the last page returned before; None starts at the beginning
+
+        Returns:
+            iterator of (list of Tweet objects, cursor) tuples
+        """
+        offset = cursor or 0
+        for i, tweet in enumerate(self.iter_tweets(querystring, since, until)):
+            if i >= offset:
+                yield [tweet], i + 1
+
+
+class ReplaySource(TweetSource):
+    """Serves recorded pages from disk instead of a live service.
+
+    Every file in the folder is one recorded page (e.g. a nitter .html page or a .json list of tweets).
+    The pages are parsed in the order of their file names; the search parameters are ignored.
+
+    Attributes:
+        path: folder containing the recorded pages
+        parse: function that returns the list of Tweet objects of the content of a page
+        latency: simulated response time per page (in seconds)
+    """
+    def __init__(self, path:str, parse, latency:float=0.0) -> None:
+        self.path = path
+        self.parse = parse
+        self.latency = latency
+
+    def iter_tweets(self, querystring:str, since:datetime.datetime, until:datetime.datetime):
+        for file_name in sorted(os.listdir(self.path)):
+            time.sleep(self.latency)
+            with open(os.path.join(self.path, file_name), encoding='utf-8') as f:
+                content = f.read()
+            tweets = self.parse(content)
+            if not tweets:
+                logger.warning(f'no tweets found on the recorded page {file_name}')
+            yield from tweets
+
+
+def benchmark(source:TweetSource, querystring:str, since:datetime.datetime, until:datetime.datetime,
+              path:str=None, batch_size:int=20):
+    """Measures the throughput of collection, parsing and persistence.
+
+    The tweets of the source are saved in batches to a TweetStore; a temporary store folder is removed afterwards.
+    Raises ValueError if the source returns no tweets, e.g. because the recorded pages cannot be parsed,
+    since the runtime of such a run is not comparable.
+
+    Args:
+        source (TweetSource): source to be measured, e.g. a ReplaySource
+        querystring (str): query string to use to search for tweets
+        since (datetime.datetime): start time
+        until (datetime.datetime): end time
+        path (str, optional): folder of the TweetStore, which is kept; a new temporary folder by default
+        batch_size (int, optional): number of tweets saved at once
+
+    Returns:
+        result (dict): number of tweets, runtimes in seconds and tweets per second
+    """
+    created = path is None
+    path = path or tempfile.mkdtemp()
+    store = TweetStore(path)
+    number_of_tweets = 0
+    persistence_time = 0.0
+    batch = []
+    start_time = time.perf_counter()
+    try:
+        for tweet in source.iter_tweets(querystring, since, until):
+            batch.append(tweet)
+            if len(batch) >= batch_size:
+                persistence_start_time = time.perf_counter()
+                store.append(batch)
+                persistence_time += time.perf_counter() - persistence_start_time
+                number_of_tweets += len(batch)
+                batch = []
+        persistence_start_time = time.perf_counter()
+        store.append(batch)
+        persistence_time += time.perf_counter() - persistence_start_time
+        number_of_tweets += len(batch)
+        total_time = time.perf_counter() - start_time
+    finally:
+        if created:
+            shutil.rmtree(path)
+    if not number_of_tweets:
+        raise ValueError('the source returned no tweets; check that its pages can be parsed')
+
+    result = {
+        'tweets': number_of_tweets,
+        'total_seconds': total_time,
+        'collection_seconds': total_time - persistence_time,
+        'persistence_seconds': persistence_time,
+        'tweets_per_second': number_of_tweets / total_time if total_time else float('inf'),
+    }
+    logger.info(f'benchmark: {number_of_tweets} tweets in {round(total_time, 2)} s ({round(result["tweets_per_second"], 1)} tweets/s)')
+    return result
@@ -0,0 +1,120 @@
+from array import array
+import datetime
+
+import pyarrow as pa
+
+
+TWEET_FIELDS = {
+    'url': 'string',
+    'date': 'timestamp',
+    'rawContent': 'string',
+    'lang': 'string',
+    'replyCount': 'int32',
+    'retweetCount': 'int32',
+    'likeCount': 'int32',
+}
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class TweetBatch:
+    """Columnar buffer for collected tweets.
+
+    Instead of keeping a dataclass object per tweet, the values are appended to one buffer per column:
+    strings as utf-8 bytes plus int32 offsets, dates as int64 microseconds since the epoch (UTC) and
+    counters as int32 arrays. Like in arrow, missing values (None) are marked in a validity bitmap per
+    column, so they are null in the exported table. The buffers are handed to arrow without copying them.
+    A batch must not be extended while a table exported with to_arrow is still in use, because the
+    exported buffers cannot be resized.
+
+    Attributes:
+        fields: dict of column name and type ('string', 'timestamp' or 'int32')
+    """
+    __slots__ = ('fields', '_columns', '_validity', '_null_counts', '_length')
+
+    def __init__(self, fields:dict=None) -> None:
+        self.fields = dict(fields or TWEET_FIELDS)
+        self._columns = {}
+        for name, kind in self.fields.items():
+            if kind == 'string':
+                self._columns[name] = (bytearray(), array('i', [0]))
+            elif kind == 'timestamp':
+                self._columns[name] = array('q')
+            elif kind == 'int32':
+                self._columns[name] = array('i')
+            else:
+                raise ValueError(f'unknown column type {kind}')
+        self._validity = {name: bytearray() for name in self.fields} # one bit per value; 0 = missing
+        self._null_counts = dict.fromkeys(self.fields, 0)
+        self._length = 0
+
+    @classmethod
+    def from_tweets(cls, tweets, fields:dict=None):
+        """Builds a batch from an iterable of Tweet objects."""
+        batch = cls(fields)
+        batch.extend(tweets)
+        return batch
+
+    def append(self, tweet):
+        """Appends the attributes of a Tweet object to the column buffers."""
+        bit = self._length % 8
+        for name, kind in self.fields.items():
+            value = getattr(tweet, name)
+            validity = self._validity[name]
+            if bit == 0:
+                validity.append(0)
+            if value is None:
+                self._null_counts[name] += 1 # the slot of a missing value is empty (strings) or 0
+            else:
+                validity[-1] |= 1 << bit
+            if kind == 'string':
+                data, offsets = self._columns[name]
+                if value is not None:
+                    data += str(value).encode('utf-8')
+                offsets.append(len(data))
+            elif kind == 'timestamp':
+                self._columns[name].append(_to_epoch_microseconds(value) if value is not None else 0)
+            else:
+                self._columns[name].append(value if value is not None else 0)
+        self._length += 1
+
+    def extend(self, tweets):
+        """Appends an iterable of Tweet objects."""
+        for tweet in tweets:
+            self.append(tweet)
+
+    def column(self, name:str):
+        """Returns the values of a column as a list."""
+        return self.to_arrow().column(name).to_pylist()
+
+    def to_arrow(self):
+        """Returns the batch as an arrow table that shares the memory of the column buffers."""
+        arrays = []
+        for name, kind in self.fields.items():
+            null_count = self._null_counts[name]
+            validity = pa.py_buffer(self._validity[name]) if null_count else None
+            if kind == 'string':
+                data, offsets = self._columns[name]
+                arrays.append(pa.Array.from_buffers(pa.string(), self._length, [validity, pa.py_buffer(offsets), pa.py_buffer(data)], null_count))
+            elif kind == 'timestamp':
+                arrays.append(pa.Array.from_buffers(pa.timestamp('us', tz='UTC'), self._length, [validity, pa.py_buffer(self._columns[name])], null_count))
+            else:
+                arrays.append(pa.Array.from_buffers(pa.int32(), self._length, [validity, pa.py_buffer(self._columns[name])], null_count))
+        return pa.Table.from_arrays(arrays, names=list(self.fields))
+
+    def to_dataframe(self):
+        """Returns the batch as a pandas dataframe."""
+        return self.to_arrow().to_pandas()
+
+    def __len__(self):
+        return self._length
+
+
+def _to_epoch_microseconds(value):
+    # dates are datetime objects (naive dates are treated as UTC) or iso formatted strings
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return (value - _EPOCH) // _MICROSECOND
@@ -0,0 +1,210 @@
+import dataclasses
+import json
+import os
+import threading
+
+import pyarrow as pa
+
+from src.data.checkpoint import fsync_path, write_json_atomic
+from src.data.tweet_batch import TweetBatch
+
+
+# schema promotion of concat_tables; pyarrow < 14 only knows the promote flag
+_PROMOTE_OPTIONS = {'promote_options': 'default'} if int(pa.__version__.split('.')[0]) >= 14 else {'promote': True}
+
+
+class TweetStore:
+    """Append-only columnar storage for collected tweets.
+
+    Every call of append writes the tweets as a new segment (an Arrow IPC file) into the store folder.
+    The completed segments are listed in a journal (manifest.jsonl), to which one line is appended and
+    flushed to disk after a segment has been written and flushed, so an interrupted collection never leaves
+    a half-written segment in the store and an append does not rewrite the list of all segments.
+    compact, e.g. called when a collection is finished, merges consecutive small segments into segments of
+    up to SEGMENT_ROWS rows and moves the journal into the manifest (manifest.json), which names the journal
+    for the next appends. Appends to the same folder are serialised, also across several TweetStore objects
+    of a process. Loading memory-maps the segments and concatenates them into a dataframe.
+
+    Attributes:
+        path: path to the store folder
+    """
+    MANIFEST = 'manifest.json'
+    JOURNAL = 'manifest.jsonl'
+    SEGMENT_ROWS = 100000
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    def __init__(self, path:str) -> None:
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        with TweetStore._locks_lock:
+            self._lock = TweetStore._locks.setdefault(os.path.abspath(path), threading.Lock())
+        with self._lock:
+            self._read_manifest()
+
+    def append(self, tweets, label:str=None):
+        """Writes a TweetBatch or a list of Tweet objects as a new segment.
+
+        Args:
+            tweets (TweetBatch | list): TweetBatch or list of Tweet objects (dataclasses)
+            label (str, optional): description of the segment, e.g. the day the tweets were collected for
+        """
+        if not len(tweets):
+            return
+        if isinstance(tweets, TweetBatch):
+            table = tweets.to_arrow()
+        else:
+            table = pa.Table.from_pylist([dataclasses.asdict(tweet) for tweet in tweets])
+        with self._lock:
+            # other TweetStore objects may have appended segments in the meantime
+            self._read_journal()
+            file_name = self._write_segment(table)
+            segment = {'file': file_name, 'rows': table.num_rows, 'label': label}
+            line = (json.dumps(segment) + '\n').encode('utf-8')
+            with open(os.path.join(self.path, self._journal), 'ab') as f:
+                f.truncate(self._journal_offset) # cut off an incomplete line of an interrupted append
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_offset += len(line)
+            self._add_segment(segment)
+
+    def compact(self, segment_rows:int=None):
+        """Merges consecutive small segments and moves the segments of the journal into the manifest.
+
+        The new manifest names a new journal. Until it has replaced the old manifest, the old segments and
+        journal stay in place, so an interrupted compaction leaves the store as it was.
+
+        Args:
+            segment_rows (int, optional): maximum number of rows of a merged segment; SEGMENT_ROWS by default
+        """
+        segment_rows = segment_rows or self.SEGMENT_ROWS
+        with self._lock:
+            self._read_journal()
+            segments = []
+            merged_files = []
+            for group in self._merge_groups(segment_rows):
+                if len(group) == 1:
+                    segments.append(group[0])
+                    continue
+                labels = [segment['label'] for segment in group if segment['label'] is not None]
+                segments.append({'file': self._write_segment(self._read_segments(group).combine_chunks()),
+                                 'rows': sum(segment['rows'] for segment in group),
+                                 'label': ','.join(dict.fromkeys(labels)) or None})
+                merged_files.extend(segment['file'] for segment in group)
+            generation = self._manifest.get('generation', 0) + 1
+            old_journal = self._journal
+            write_json_atomic(os.path.join(self.path, self.MANIFEST),
+                              {'segments': segments, 'generation': generation, 'journal': f'manifest-{generation:06d}.jsonl'})
+            for file_name in [old_journal] + merged_files:
+                if os.path.isfile(os.path.join(self.path, file_name)):
+                    os.remove(os.path.join(self.path, file_name))
+            fsync_path(self.path)
+            self._read_manifest()
+
+    def to_dataframe(self):
+        """Loads all segments into a pandas dataframe."""
+        return self.to_table().to_pandas()
+
+    def to_table(self):
+        """Loads all segments into a single memory-mapped arrow table."""
+        if not self._manifest['segments']:
+            return pa.table({})
+        return self._read_segments(self._manifest['segments'])
+
+    @staticmethod
+    def is_store(path:str):
+        """Checks whether path is a TweetStore folder."""
+        return os.path.isfile(os.path.join(path, TweetStore.MANIFEST)) or os.path.isfile(os.path.join(path, TweetStore.JOURNAL))
+
+    def _read_segments(self, segments:list):
+        tables = []
+        for segment in segments:
+            with pa.memory_map(os.path.join(self.path, segment['file']), 'r') as source:
+                tables.append(pa.ipc.open_file(source).read_all())
+        return pa.concat_tables(tables, **_PROMOTE_OPTIONS)
+
+    def _write_segment(self, table:pa.Table):
+        # an unlisted file with the same name is left over from an interrupted append or compaction
+        file_name = f'segment-{self._next_segment:06d}.arrow'
+        with pa.OSFile(os.path.join(self.path, file_name), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        fsync_path(os.path.join(self.path, file_name))
+        self._next_segment += 1
+        return file_name
+
+    def _merge_groups(self, segment_rows:int):
+        # consecutive segments with together at most segment_rows rows; larger segments form a group of their own
+        groups = []
+        group = []
+        rows = 0
+        for segment in self._manifest['segments']:
+            if group and rows + segment['rows'] > segment_rows:
+                groups.append(group)
+                group = []
+                rows = 0
+            group.append(segment)
+            rows += segment['rows']
+        if group:
+            groups.append(group)
+        return groups
+
+    def _add_segment(self, segment:dict):
+        self._files.add(segment['file'])
+        self._manifest['segments'].append(segment)
+        self._next_segment = max(self._next_segment, int(segment['file'][len('segment-'):-len('.arrow')]) + 1)
+
+    def _read_manifest(self):
+        path = os.path.join(self.path, self.MANIFEST)
+        self._manifest = {'segments': []}
+        self._manifest_stat = None
+        if os.path.isfile(path):
+            with open(path) as f:
+                self._manifest = json.load(f)
+                self._manifest_stat = _stat_key(os.fstat(f.fileno()))
+        self._journal = self._manifest.get('journal', self.JOURNAL)
+        segments = self._manifest['segments']
+        self._manifest['segments'] = []
+        self._files = set()
+        self._next_segment = 0
+        for segment in segments:
+            self._add_segment(segment)
+        self._journal_offset = 0
+        self._read_journal()
+
+    def _read_journal(self):
+        # a new manifest (written by compact of another TweetStore object) lists the journal and names a new one
+        try:
+            manifest_stat = _stat_key(os.stat(os.path.join(self.path, self.MANIFEST)))
+        except FileNotFoundError:
+            manifest_stat = None
+        if manifest_stat != self._manifest_stat:
+            return self._read_manifest()
+        # reads the lines appended since the last read
+        path = os.path.join(self.path, self._journal)
+        size = os.path.getsize(path) if os.path.isfile(path) else 0
+        if size <= self._journal_offset:
+            return
+        with open(path, 'rb') as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break # incomplete line of an interrupted append
+                segment = json.loads(line)
+                if segment['file'] not in self._files:
+                    self._add_segment(segment)
+                self._journal_offset += len(line)
+
+    def __get_num_rows(self):
+        return sum(segment['rows'] for segment in self._manifest['segments'])
+
+    def __get_segments(self):
+        return list(self._manifest['segments'])
+
+    num_rows = property(__get_num_rows)
+    segments = property(__get_segments)
+
+
+def _stat_key(stat:os.stat_result):
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
@@ -1,14 +1,23 @@
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 import argparse
 import datetime
+import json
 import math
 import pickle
 import logging
 import time
 
 from tqdm import tqdm
+import snscrape.base
 import snscrape.modules.twitter as sntwitter
-import pandas as pd
+
+from src.data.checkpoint import Checkpoint
+from src.data.duplicate_filter import DuplicateFilter
+from src.data.rate_limiting import AdaptiveRateLimiter
+from src.data.sources import TweetSource
+from src.data.tweet_batch import TweetBatch
+from src.data.tweet_store import TweetStore
 
 
 # - Exception classes
@@ -19,7 +28,7 @@ class TwitterAPIEndpointError(Exception):
 @dataclass
 class Tweet:
     url:str
-    date:str
+    date:datetime.datetime
     rawContent:str
     lang:str
     replyCount:int
@@ -34,6 +43,7 @@ class Recovery:
     since:datetime.datetime
     until:datetime.datetime
     limit:int
+    completed_days:list = field(default_factory=list)
 
 
 class Logger:
@@ -56,86 +66,154 @@ class Logger:
         self.logger.addHandler(console_handler)
 
 
-def get_tweets(querystring:str, since:datetime.datetime, until:datetime.datetime, limit:int):
+def get_tweets(querystring:str, since:datetime.datetime, until:datetime.datetime, limit:int,
+               workers:int=1, requests_per_second:float=2.0, source:TweetSource=None, completed_days:list=None,
+               rate_limiter:AdaptiveRateLimiter=None, max_retries:int=3, save_interval:int=200):
     """Collects Twitter data.
 
     Uses a scraper, which collects Twitter posts for a given query string and a given period of time.
+    The days of the period are collected by a pool of worker threads. The tweets of a day are saved in
+    segments of save_interval tweets; every segment is committed to the checkpoint
+    'recovery_<IDENTIFICATION_KEY>.json', so a restart skips the completed days and continues
+    the started days after their last saved tweet. Tweets that were already collected are dropped
+    before they are saved, so the number of tweets per day counts unique tweets only.
 
     Args:
         querystring (str): query string to use to search for tweets
         since (datetime.datetime): start time
         until (datetime.datetime): end time
         limit (int): specifies how many posts should be collected in total
+        workers (int, optional): number of days collected concurrently
+        requests_per_second (float, optional): initial request rate shared by all workers; adapted to the responses
+        source (TweetSource, optional): source of the tweets; defaults to SnscrapeSource
+        completed_days (list, optional): days ('%Y-%m-%d') that were already collected and are skipped (recovery files of older versions)
+        rate_limiter (AdaptiveRateLimiter, optional): rate limiter shared with other collections; replaces requests_per_second
+        max_retries (int, optional): number of times a day is continued after an error
+        save_interval (int, optional): number of tweets saved and committed at once
     """
     tweets_to_collect_per_day = math.ceil(limit / ((until - since).days)) # aufrunden
-    iteration_date = since
-    
-    tweets_collected_total = 0
-    while iteration_date < until:
-        query = f'{querystring} since:{iteration_date.strftime("%Y-%m-%d")} until:{(iteration_date + datetime.timedelta(days=1)).strftime("%Y-%m-%d")}'
-        logger.info(f'collecting ~ {tweets_to_collect_per_day}: {iteration_date.strftime("%Y-%m-%d")} - {(iteration_date + datetime.timedelta(days=1)).strftime("%Y-%m-%d")}')
-
-        list_of_collected_tweets = []
-        for i, tweet in tqdm(enumerate(sntwitter.TwitterSearchScraper(query).get_items()), total=tweets_to_collect_per_day):
-            if i > tweets_to_collect_per_day:
-                break
+    source = source or SnscrapeSource()
+    rate_limiter = rate_limiter or AdaptiveRateLimiter(rate=requests_per_second)
+    completed_days = list(completed_days or [])
+    checkpoint = Checkpoint(
+        path=f'recovery_{IDENTIFICATION_KEY}.json',
+        params={'IDENTIFICATION_KEY': IDENTIFICATION_KEY, 'querystring': querystring, 'since': since.strftime("%Y-%m-%d"),
+                'until': until.strftime("%Y-%m-%d"), 'limit': limit}
+    )
+    days = [since + datetime.timedelta(days=i) for i in range((until - since).days)]
+    days = [day for day in days if day.strftime("%Y-%m-%d") not in completed_days and not checkpoint.is_complete(day.strftime("%Y-%m-%d"))]
+
+    store = TweetStore(f'data_{IDENTIFICATION_KEY}')
+    duplicate_filter = DuplicateFilter(f'tweet_ids_{IDENTIFICATION_KEY}.bin')
+
+    def _process_day(day):
+        _collect_day(querystring, day, tweets_to_collect_per_day, source, rate_limiter, store, checkpoint,
+                     duplicate_filter, max_retries, save_interval, progress=workers == 1)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_process_day, days))
+    store.compact()
+    checkpoint.compact()
+    logger.info(f'Done. {checkpoint.num_tweets} tweets collected ({duplicate_filter.duplicates} duplicates removed).\n')
+
+
+class SnscrapeSource(TweetSource):
+    """Searches tweets with snscrape."""
+    def iter_tweets(self, querystring:str, since:datetime.datetime, until:datetime.datetime):
+        query = f'{querystring} since:{since.strftime("%Y-%m-%d")} until:{until.strftime("%Y-%m-%d")}'
+        for tweet in sntwitter.TwitterSearchScraper(query).get_items():
+            yield Tweet(tweet.url, 
+                        tweet.date,
+                        tweet.renderedContent,
+                        tweet.lang,
+                        tweet.replyCount,
+                        tweet.retweetCount,
+                        tweet.likeCount)
+
+
+def parse_json_page(content:str):
+    """Parses a recorded .json page (a list of tweet dicts) for the ReplaySource."""
+    return [Tweet(**tweet) for tweet in json.loads(content)]
+
+
+_PAGE_SIZE = 20 # number of tweets snscrape receives per request
+
+def _collect_day(querystring:str, day:datetime.datetime, tweets_to_collect:int, source:TweetSource,
+                 rate_limiter:AdaptiveRateLimiter, store:TweetStore, checkpoint:Checkpoint, duplicate_filter:DuplicateFilter,
+                 max_retries:int=3, save_interval:int=200, progress:bool=True):
+    partition = day.strftime("%Y-%m-%d")
+    logger.info(f'collecting ~ {tweets_to_collect}: {partition} - {(day + datetime.timedelta(days=1)).strftime("%Y-%m-%d")}')
+
+    def _save(list_of_collected_tweets, cursor, complete=False):
+        store.append(list_of_collected_tweets, label=partition)
+        duplicate_filter.commit(list_of_collected_tweets)
+        checkpoint.commit(partition, len(list_of_collected_tweets), cursor, complete)
+
+    for attempt in range(max_retries + 1):
+        # continue after the last committed tweets of the day
+        number_of_collected_tweets, cursor = checkpoint.progress(partition)
+        list_of_collected_tweets = TweetBatch()
+        number_of_received_tweets = 0
+        try:
+            rate_limiter.acquire()
+            request_time = time.monotonic()
+            with tqdm(total=tweets_to_collect, initial=number_of_collected_tweets, disable=not progress) as pbar:
+                if number_of_collected_tweets < tweets_to_collect:
+                    for page, cursor in source.iter_pages(querystring, day, day + datetime.timedelta(days=1), cursor):
+                        if number_of_received_tweets and number_of_received_tweets % _PAGE_SIZE == 0:
+                            # the next tweets are loaded with a new request
+                            rate_limiter.success(latency=time.monotonic() - request_time)
+                            rate_limiter.acquire()
+                            request_time = time.monotonic()
+                        number_of_received_tweets += len(page)
+                        page = duplicate_filter.filter(page)
+                        list_of_collected_tweets.extend(page)
+                        number_of_collected_tweets += len(page)
+                        pbar.update(len(page))
+                        if len(list_of_collected_tweets) >= save_interval:
+                            _save(list_of_collected_tweets, cursor)
+                            list_of_collected_tweets = TweetBatch()
+                        if number_of_collected_tweets >= tweets_to_collect:
+                            break
+            rate_limiter.success(latency=time.monotonic() - request_time)
+            logger.info(f'secure collected data: {partition}')
+            _save(list_of_collected_tweets, cursor, complete=True)
+            return
+        except (snscrape.base.ScraperException, OSError) as e:
+            duplicate_filter.discard(list_of_collected_tweets) # these tweets are collected again
+            backoff = rate_limiter.failure()
+            if attempt < max_retries:
+                logger.warning(f'collection failed ({e}); retry {attempt+1}/{max_retries} in {round(backoff, 1)} s')
             else:
-                t = Tweet(tweet.url, 
-                          tweet.date,
-                          tweet.renderedContent,
-                          tweet.lang,
-                          tweet.replyCount,
-                          tweet.retweetCount,
-                          tweet.likeCount)
-                list_of_collected_tweets.append(t)
-        
-        logger.info('collection completed successfully!')
-        _save_collected_tweets(list_of_collected_tweets)
-        tweets_collected_total += len(list_of_collected_tweets)
-        del list_of_collected_tweets
-        iteration_date += datetime.timedelta(days=1)
-        _update_recovery(querystring, iteration_date, until, (limit - tweets_collected_total))
-        logger.info('Done.\n')
+                logger.warning(f'collection failed ({e}); no retries left')
+    logger.error(f'{partition} could not be collected completely')
 
 
 def transform_to_dataframe(path:str):
     """Transforms collected data into a pandas dataframe.
 
-    Reads a file containing a list of Tweet objects. Then the data of the tweet objects is read out.
-    and transformed into a data frame.
+    Reads a TweetStore folder or, for data collected with older versions, a .PKL file containing
+    Tweet objects, which are converted column by column with a TweetBatch.
 
     Args:
-        path (str): path to .PKL file
+        path (str): path to the TweetStore folder or .PKL file
 
     Returns:
         dataframe (pd.DataFrame): dataframe containing the collected data
     
     """
-    list_of_tweets = []
+    if TweetStore.is_store(path):
+        return TweetStore(path).to_dataframe()
+
+    batch = TweetBatch()
     with open(path, 'rb') as f:
         while True:
             try:
                 obj = pickle.load(f)
             except EOFError:
                 break
-            list_of_tweets.append(obj)
-
-    dict_of_tweets =  [{'url': tweet.url, 'date': tweet.date, 'rawContent': tweet.rawContent, 'lang': tweet.lang, 'replyCount': tweet.replyCount, 'retweetCount': tweet.retweetCount, 'likeCount': tweet.likeCount} for tweet in list_of_tweets]
-    return pd.DataFrame(dict_of_tweets)
-
-
-def _save_collected_tweets(list_of_collected_tweets:list):
-    logger.info('secure collected data')
-    for tweet in list_of_collected_tweets:
-        with open(f'data_{IDENTIFICATION_KEY}.pkl', 'ab') as f:
-            pickle.dump(tweet, f)
-
-
-def _update_recovery(querystring, since, until, limit):
-    logger.info('update recovery file')
-    r = Recovery(IDENTIFICATION_KEY, querystring, since, until, limit)
-    with open(f'recovery_{IDENTIFICATION_KEY}.pkl', 'wb') as f:
-        pickle.dump(r, f)
+            batch.append(obj)
+    return batch.to_dataframe()
 
 
 if __name__ == '__main__':
@@ -151,6 +229,8 @@ if __name__ == '__main__':
         scraper_parser.add_argument('-q', '--querystring', required=True, help='')
         scraper_parser.add_argument('-t', '--period', nargs=2, required=True, help='Start- und Endzeitpunkt Y-m-d ')
         scraper_parser.add_argument('-l', '--limit', required=True, help='')       
+        scraper_parser.add_argument('-w', '--workers', default=1, help='number of days collected concurrently')
+        scraper_parser.add_argument('-r', '--rate', default=2.0, help='initial number of requests per second')
         scraper_args, scraper_unknown = scraper_parser.parse_known_args(unknown)
 
         IDENTIFICATION_KEY = str(int(datetime.datetime.now().timestamp()))
@@ -164,7 +244,9 @@ if __name__ == '__main__':
             querystring = str(scraper_args.querystring),
             since = datetime.datetime.strptime(scraper_args.period[0], '%Y-%m-%d'),
             until = datetime.datetime.strptime(scraper_args.period[1], '%Y-%m-%d'),
-            limit = int(scraper_args.limit)
+            limit = int(scraper_args.limit),
+            workers = int(scraper_args.workers),
+            requests_per_second = float(scraper_args.rate)
         )
         logger.info('Scraping successfully completed!')
 
@@ -173,8 +255,14 @@ if __name__ == '__main__':
         recovery_parser.add_argument('file', help='')
         recovery_parser, recovery_unknown = recovery_parser.parse_known_args(unknown)
 
-        with open(recovery_parser.file , 'rb') as f:
-            recovery = pickle.load(f)
+        if recovery_parser.file.endswith('.json'):
+            params = Checkpoint(recovery_parser.file).params
+            recovery = Recovery(params['IDENTIFICATION_KEY'], params['querystring'],
+                                datetime.datetime.strptime(params['since'], '%Y-%m-%d'),
+                                datetime.datetime.strptime(params['until'], '%Y-%m-%d'), params['limit'])
+        else: # recovery file of older versions
+            with open(recovery_parser.file , 'rb') as f:
+                recovery = pickle.load(f)
 
         IDENTIFICATION_KEY = recovery.IDENTIFICATION_KEY
 
@@ -182,7 +270,8 @@ if __name__ == '__main__':
             querystring = recovery.querystring,
             since = recovery.since,
             until = recovery.until,
-            limit = recovery.limit
+            limit = recovery.limit,
+            completed_days = getattr(recovery, 'completed_days', [])
         )
 
     else:
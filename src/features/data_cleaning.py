@@ -1,7 +1,13 @@
 import datetime
+import hashlib
+import multiprocessing
+import re
+import zlib
 
-from langdetect import detect
+from langdetect import detect, DetectorFactory
+from langdetect.lang_detect_exception import LangDetectException
 from tqdm import tqdm
+import numpy as np
 import pandas as pd
 
 from src.data.nitter_scraper_standalone_v2 import Tweet, TweetScraper
@@ -15,14 +21,29 @@ class CleaningPipeline:
 
     Attributes:
         path: path to twitter_tweets_raw.pkl
+        drop_counts: number of entries removed per cleaning rule in the last run
     """
     def __init__(self, path) -> None:
         logger.info('initialize pipeline and load raw dataframe...')
         self.df = pd.read_feather(path)
+        self.language_cache = {}
 
-    def run(self):
+    def run(self, detect_language:bool=False, near_duplicate_threshold:float=None,
+            since:str='2022-10-01', until:str='2023-03-31'):
         """Execute the cleaning pipeline.
 
+        Every cleaning rule marks the entries it drops. The marks are combined into a single
+        keep mask, which is applied to the dataframe once at the end. Duplicates and languages
+        are only determined for the entries that survive the cheaper rules.
+
+        Args:
+            detect_language (bool, optional): determine the language of the texts instead of using the scraped 'lang' column;
+                always done if the data has no 'lang' column (e.g. data from the nitter scraper)
+            near_duplicate_threshold (float, optional): also remove near duplicates whose estimated jaccard similarity
+                reaches this value (e.g. 0.8); by default only duplicates with identical normalised content are removed
+            since (str, optional): entries created before this date are removed
+            until (str, optional): entries created after this date are removed
+
         Returns:
             df (pandas.DataFrame): the cleaned dataframe.
         """
@@ -30,55 +51,188 @@ class CleaningPipeline:
         logger.info('formating date...')
         self.df['date'] = pd.to_datetime(self.df['date']).dt.tz_localize(None)
 
-        if not self._text_without_null_values():
-            logger.warning('entries without text data were found!')
-            logger.info('clean _text_without_null_values...')
-            self.df.dropna(subset=['rawContent'], inplace=True)
-        
-        if not self._creation_date_in_period():
-            logger.warning('entries that were created outside of the specified period were found!')
-            logger.info('clean _creation_date_in_period...')
-            posts_not_in_period = self.df.query('date < "2022-10-01" or date > "2023-03-31"')
-            self.df.drop(index=posts_not_in_period.index, inplace=True)
-
-        if not self._no_duplicates():
-            logger.warning('duplicate entries were found!')
-            logger.info('clean _no_duplicates...')
-            self.df.drop_duplicates(subset=['rawContent'], inplace=True)
-
-        if not self._all_texts_in_english():
-            logger.warning('entries which are not in english were found!')
-            logger.info('clean _all_texts_in_english...')
-            non_english_posts = self.df.query('lang != "en"')
-            self.df.drop(index=non_english_posts.index, inplace=True)
-
-        self.df.drop(columns=['lang', 'replyCount', 'retweetCount', 'likeCount'], inplace=True)
-        self.df.set_index('url', inplace=True)
-        self.df.reset_index(inplace=True)
+        keep = pd.Series(True, index=self.df.index)
+        self.drop_counts = {}
+        def _apply_rule(name, drop):
+            self.drop_counts[name] = int((keep & drop).sum())
+            if self.drop_counts[name]:
+                logger.warning(f'{name}: {self.drop_counts[name]} entries will be removed')
+            keep.mask(drop, False, inplace=True)
+
+        _apply_rule('null_values', self.df['rawContent'].isnull())
+        _apply_rule('outside_period', (self.df['date'] < pd.Timestamp(since)) | (self.df['date'] > pd.Timestamp(until)))
+
+        if detect_language or 'lang' not in self.df.columns:
+            self.detect_languages(index=keep)
+
+        logger.info('search duplicates...')
+        _apply_rule('duplicates', self._duplicate_mask(keep, near_duplicate_threshold))
+        _apply_rule('not_english', self.df['lang'].ne('en'))
+
+        logger.info(f'clean data; remove {int((~keep).sum())} of {len(keep)} entries...')
+        self.df = self.df.loc[keep]
+        self.df = self.df.drop(columns=['lang', 'replyCount', 'retweetCount', 'likeCount'], errors='ignore')
+        self.df = self.df.set_index('url').reset_index()
         logger.info('data cleaning completed successfully!')
         return self.df
-    
 
-    def _text_without_null_values(self):
-        if self.df['rawContent'].isnull().any():
-            return False
-        else:
-            return True
-        
-    def _creation_date_in_period(self):
-        if self.df.query('date < "2018-04-01" or date > "2023-04-01"').empty:
-            return True
-        else:
-            return False
-        
-    def _no_duplicates(self):
-        if self.df['rawContent'].duplicated().any():
-            return False
-        else:
-            return True
-        
-    def _all_texts_in_english(self):
-        if self.df['lang'].eq('en').all():
-            return True
+    def detect_languages(self, index=None, workers:int=None, batch_size:int=1000):
+        """Determines the language of each text and writes it to the 'lang' column.
+
+        Texts that are clearly english (mostly ascii, several english stop words) or clearly not
+        written in a latin script are classified by heuristics; only the remaining texts are passed
+        to langdetect, in batches on a process pool and with a fixed seed for reproducible results.
+        Results are cached by a hash of the text, so duplicates are only detected once.
+
+        Args:
+            index (pd.Index | pd.Series, optional): only determine the language of these entries (index labels or a boolean
+                mask); the others are left empty
+            workers (int, optional): number of worker processes; defaults to the number of cpu cores - 1
+            batch_size (int, optional): number of texts per batch
+        """
+        logger.info('detect languages...')
+        # positional selection, so duplicate index labels (e.g. of concatenated frames) are no problem
+        if index is None:
+            selected = np.ones(len(self.df), dtype=bool)
+        elif pd.api.types.is_bool_dtype(index):
+            selected = np.asarray(index, dtype=bool)
         else:
-            return False
\ No newline at end of file
+            selected = self.df.index.isin(index)
+        texts = self.df['rawContent'][selected]
+        hashes = texts.map(_content_hash)
+        unknown = {}
+        for text, content_hash in zip(texts, hashes):
+            if content_hash in self.language_cache or content_hash in unknown:
+                continue
+            lang = _guess_language(text)
+            if lang is None:
+                unknown[content_hash] = text
+            else:
+                self.language_cache[content_hash] = lang
+
+        if unknown:
+            if workers is None:
+                workers = max(multiprocessing.cpu_count()-1, 1)
+            logger.info(f'{len(unknown)} texts could not be classified by heuristics; run langdetect on {workers} processes...')
+            keys = list(unknown.keys())
+            unknown_texts = list(unknown.values())
+            batches = [unknown_texts[i:i+batch_size] for i in range(0, len(unknown_texts), batch_size)]
+            langs = []
+            with multiprocessing.Pool(processes=workers, initializer=_init_language_worker) as pool:
+                for batch in tqdm(pool.imap(_detect_batch, batches), total=len(batches)):
+                    langs.extend(batch)
+            self.language_cache.update(zip(keys, langs))
+
+        langs = pd.Series(np.nan, index=self.df.index, dtype=object)
+        langs[selected] = hashes.map(self.language_cache).to_numpy()
+        self.df['lang'] = langs
+
+    def _duplicate_mask(self, keep:pd.Series, near_duplicate_threshold:float=None):
+        # marks every kept entry whose content duplicates an earlier kept entry
+        normalised_texts = self.df.loc[keep, 'rawContent'].map(_normalise_text)
+        duplicates = ~_first_occurrences(_content_digests(normalised_texts))
+        if near_duplicate_threshold is not None:
+            duplicates |= _near_duplicates(normalised_texts, near_duplicate_threshold)
+        mask = pd.Series(False, index=self.df.index)
+        mask[keep] = duplicates
+        return mask
+
+
+# - Language detection
+# frequent english function words; several hits in a mostly ascii text are a reliable sign of english
+_ENGLISH_STOP_WORDS = frozenset(['the', 'and', 'is', 'are', 'was', 'to', 'of', 'in', 'for', 'on', 'with', 'that', 'this',
+                                 'it', 'you', 'we', 'they', 'have', 'has', 'be', 'not', 'what', 'at', 'from', 'by', 'will'])
+
+def _content_hash(text):
+    return hashlib.blake2b(str(text).encode('utf-8'), digest_size=16).digest()
+
+
+def _guess_language(text, min_stop_words:int=3):
+    # returns 'en' or 'und' (undetermined) if the text can be classified cheaply, otherwise None
+    if not isinstance(text, str) or not text.strip():
+        return 'und'
+    letters = [char for char in text if char.isalpha()]
+    if not letters:
+        return 'und'
+    ascii_ratio = sum(char.isascii() for char in letters) / len(letters)
+    if ascii_ratio < 0.3:
+        return 'und'
+    if ascii_ratio > 0.95 and sum(word in _ENGLISH_STOP_WORDS for word in text.lower().split()) >= min_stop_words:
+        return 'en'
+    return None
+
+
+def _init_language_worker():
+    # langdetect is nondeterministic unless the seed is fixed
+    DetectorFactory.seed = 0
+
+
+def _detect_batch(texts:list):
+    langs = []
+    for text in texts:
+        try:
+            langs.append(detect(text))
+        except LangDetectException:
+            langs.append('und')
+    return langs
+
+
+# - Duplicate detection
+# Texts are compared in a normalised form, so retweet style copies that only differ in urls,
+# mentions, case or punctuation are recognised as duplicates.
+_NOISE_PATTERN = re.compile(r'https?://\S+|www\.\S+|@\w+|^rt\b|[^\w\s]')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+def _normalise_text(text):
+    text = _NOISE_PATTERN.sub(' ', str(text).lower())
+    return _WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+def _content_digests(texts):
+    # fixed width 64 bit digest per text; far smaller than holding the texts in a hash table
+    return np.fromiter((int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little') for text in texts),
+                       dtype=np.uint64, count=len(texts))
+
+
+def _first_occurrences(digests:np.ndarray):
+    mask = np.zeros(len(digests), dtype=bool)
+    mask[np.unique(digests, return_index=True)[1]] = True
+    return mask
+
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+def _near_duplicates(texts, threshold:float=0.8, num_perm:int=128, shingle_size:int=3, seed:int=0):
+    # minhash signatures of word shingles, grouped by locality sensitive hashing (lsh)
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    signatures = np.full((len(texts), num_perm), _MERSENNE_PRIME, dtype=np.uint32)
+    for i, text in enumerate(tqdm(texts)):
+        words = text.split()
+        shingles = {' '.join(words[j:j+shingle_size]) for j in range(max(len(words)-shingle_size+1, 1))}
+        x = np.fromiter((zlib.crc32(shingle.encode('utf-8')) % _MERSENNE_PRIME for shingle in shingles), dtype=np.uint64, count=len(shingles))
+        signatures[i] = ((np.outer(a, x) + b[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+    bands, rows = _lsh_parameters(threshold, num_perm)
+    parents = np.arange(len(texts))
+    def _root(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+    for band in range(bands):
+        buckets = {}
+        for i, key in enumerate(signatures[:, band*rows:(band+1)*rows]):
+            first = buckets.setdefault(key.tobytes(), i)
+            # verify candidate pairs with the estimated jaccard similarity
+            if first != i and np.mean(signatures[first] == signatures[i]) >= threshold:
+                root_first, root_i = _root(first), _root(i)
+                parents[max(root_first, root_i)] = min(root_first, root_i)
+    return np.array([_root(i) != i for i in range(len(texts))], dtype=bool)
+
+
+def _lsh_parameters(threshold:float, num_perm:int):
+    # number of bands and rows per band whose s-curve threshold (1/bands)^(1/rows) is closest to threshold
+    candidates = [(bands, num_perm // bands) for bands in range(1, num_perm+1)]
+    return min(candidates, key=lambda c: abs((1 / c[0]) ** (1 / c[1]) - threshold))
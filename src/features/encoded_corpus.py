@@ -0,0 +1,113 @@
+import json
+import os
+
+import numpy as np
+
+
+class EncodedCorpus:
+    """Integer encoded representation of preprocessed token lists.
+
+    All documents are stored in one flat int32 array of token ids plus an offsets array, which
+    marks where each document starts (CSR layout). Each distinct token is stored only once in the
+    vocabulary. The arrays can be saved and memory-mapped, so the corpus does not have to be held
+    in memory as python strings.
+
+    Attributes:
+        vocabulary: list of tokens; the position of a token is its id
+        token_ids: flat array of the token ids of all documents
+        offsets: array of length number of documents + 1; document i is token_ids[offsets[i]:offsets[i+1]]
+    """
+    def __init__(self, vocabulary:list=None, token_ids:np.ndarray=None, offsets:np.ndarray=None) -> None:
+        self.vocabulary = vocabulary if vocabulary is not None else []
+        self._token2id = {token: i for i, token in enumerate(self.vocabulary)}
+        self._token_ids = token_ids
+        self._offsets = offsets
+        # documents added with add() are buffered until the arrays are requested
+        self._pending_ids = []
+        self._pending_lengths = []
+
+    def add(self, tokens:list):
+        """Encodes a document and appends it to the corpus; new tokens are added to the vocabulary."""
+        for token in tokens:
+            token_id = self._token2id.get(token)
+            if token_id is None:
+                token_id = self._token2id[token] = len(self.vocabulary)
+                self.vocabulary.append(token)
+            self._pending_ids.append(token_id)
+        self._pending_lengths.append(len(tokens))
+
+    @classmethod
+    def from_token_lists(cls, token_lists):
+        """Builds an encoded corpus from an iterable of token lists."""
+        corpus = cls()
+        for tokens in token_lists:
+            corpus.add(tokens)
+        return corpus
+
+    def document_ids(self, i:int):
+        """Returns the token ids of the i-th document."""
+        return self.token_ids[self.offsets[i]:self.offsets[i+1]]
+
+    def bow(self, i:int):
+        """Returns the i-th document in bag-of-words format, i.e. a list of (token id, count) tuples."""
+        ids, counts = np.unique(self.document_ids(i), return_counts=True)
+        return list(zip(ids.tolist(), counts.tolist()))
+
+    def bow_corpus(self):
+        """Returns all documents in bag-of-words format."""
+        return [self.bow(i) for i in range(len(self))]
+
+    def save(self, path:str):
+        """Saves the corpus in the folder path (token_ids.npy, offsets.npy and vocabulary.json)."""
+        if not os.path.exists(path):
+            os.makedirs(path)
+        np.save(os.path.join(path, 'token_ids.npy'), self.token_ids)
+        np.save(os.path.join(path, 'offsets.npy'), self.offsets)
+        with open(os.path.join(path, 'vocabulary.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.vocabulary, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path:str, mmap:bool=True):
+        """Loads a saved corpus; the arrays are memory-mapped by default."""
+        mmap_mode = 'r' if mmap else None
+        token_ids = np.load(os.path.join(path, 'token_ids.npy'), mmap_mode=mmap_mode)
+        offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode=mmap_mode)
+        with open(os.path.join(path, 'vocabulary.json'), encoding='utf-8') as f:
+            vocabulary = json.load(f)
+        return cls(vocabulary, token_ids, offsets)
+
+    def _flush(self):
+        # moves the buffered documents into the arrays
+        if not self._pending_lengths and self._token_ids is not None:
+            return
+        token_ids = np.array(self._pending_ids, dtype=np.int32)
+        lengths = np.array(self._pending_lengths, dtype=np.int64)
+        if self._token_ids is None:
+            self._token_ids = token_ids
+            self._offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        else:
+            self._offsets = np.concatenate([self._offsets, self._offsets[-1] + np.cumsum(lengths)]).astype(np.int64)
+            self._token_ids = np.concatenate([self._token_ids, token_ids])
+        self._pending_ids = []
+        self._pending_lengths = []
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i:int):
+        return [self.vocabulary[token_id] for token_id in self.document_ids(i).tolist()]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __get_token_ids(self):
+        self._flush()
+        return self._token_ids
+
+    def __get_offsets(self):
+        self._flush()
+        return self._offsets
+
+    token_ids = property(__get_token_ids)
+    offsets = property(__get_offsets)
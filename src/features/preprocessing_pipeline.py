@@ -4,13 +4,22 @@ import nltk
 import string
 import emoji
 import re
+import multiprocessing
+import time
+import os
+
+from collections import OrderedDict
+
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 from nltk.tokenize import WordPunctTokenizer
 
 from tqdm import tqdm
-from src.utils import logger
+from src.features.encoded_corpus import EncodedCorpus
+from src.utils import logger, safe_as_pkl, load_pkl
 
 
 class PreprocessingPipeline:
@@ -20,13 +29,14 @@ class PreprocessingPipeline:
 
     Attributes:
         dataframe: A pandas dataframe; The text to be processed must be in the 'rawContent' column.
+        cache: optional TokenCache; token level results are then computed once per distinct token
+        additional_stop_words: optional list of stop words in addition to the nltk list; defaults to ADDITIONAL_STOP_WORDS
     """
-    def __init__(self, dataframe:pd.DataFrame) -> None:
+    def __init__(self, dataframe:pd.DataFrame, cache=None, additional_stop_words:list=None) -> None:
         logger.info('initialize pipeline and download required nltk packages...')
-        # download required nltk packages
-        nltk.download('punkt')
-        nltk.download('stopwords')
-        nltk.download('wordnet')
+        _download_nltk_packages()
+        self.cache = cache
+        self.additional_stop_words = additional_stop_words
         self.__dataframe = dataframe
         self.__dataframe['preprocessed_text'] = self.__dataframe['rawContent'].copy()
         tqdm.pandas()
@@ -34,94 +44,130 @@ class PreprocessingPipeline:
     def remove_urls(self):
         """Removes URLs from the text."""
         logger.info('remove urls...')
-        def _remove_urls(text):
-            # define regex pattern for url detection
-            url_pattern = re.compile(r'\b(?:https?://)?(?:[a-z]+\.[a-z]+\.[a-z]+|[a-z]+\.[a-z]+(?:/[^\s]*)?)\b')
-            # remove url matches from the text
-            text_without_urls = re.sub(url_pattern, '', text)
-            return text_without_urls
-        self.__dataframe['preprocessed_text'] = self.__dataframe['preprocessed_text'].progress_apply(_remove_urls)
+        self._apply(_build_remove_urls(self.cache))
 
     def remove_mentions(self):
         """Removes mentions of other Twitter users from the text."""
         logger.info('remove twitter user mentions...')
-        def _remove_mentions(text):
-            # define regex pattern for user mentions
-            mention_pattern = re.compile(r'@\w+')
-            # remove user mentions from the text
-            text_without_mentions = re.sub(mention_pattern, '', text)
-            return text_without_mentions
-        self.__dataframe['preprocessed_text'] = self.__dataframe['preprocessed_text'].progress_apply(_remove_mentions)
+        self._apply(_build_remove_mentions(self.cache))
 
     def fix_contractions(self):
         """Repairs english language contractions."""
         logger.info('fix contractions...')
-        def _fix_contractions(text):
-            try:
-                return contractions.fix(text)
-            except IndexError: # error should not appear
-                return text
-        self.__dataframe['preprocessed_text'] = self.__dataframe['preprocessed_text'].progress_apply(_fix_contractions)
+        self._apply(_build_fix_contractions(self.cache))
 
     def tokenize_text(self):
         """Performs a tokenization of the texts."""
         logger.info('tokenize text...')
-        # define tokenizer function
-        tokenizer = WordPunctTokenizer()
-        def _tokenize_text(text):
-            return tokenizer.tokenize(text)
-        self.__dataframe['preprocessed_text'] = self.__dataframe['preprocessed_text'].progress_apply(_tokenize_text)
+        self._apply(_build_tokenize_text(self.cache))
 
     def lowercase(self):
         """Performs a lowercasing of the tokens."""
         logger.info('lowercase tokens...')
-        def _lowercase(tokens):
-            return [token.lower() for token in tokens]
-        self.__dataframe['preprocessed_text'] = self.__dataframe['preprocessed_text'].progress_apply(_lowercase)
+        self._apply(_build_lowercase(self.cache))
 
     def remove_punct(self):
         """Removes punctuation within token lists."""
         logger.info('remove punctuation...')
-        # adding more characters to the punctuation list
-        punct = string.punctuation + "’" + "``" +"`" + "''" +"'" + "•" + "“" + "”" + "…" + "�" + "‘" + "…" + "/…" + "-…" + "-#" + "’" + "..." + ".”" + "!!"
-        def _remove_punct(tokens):
-            return [token for token in tokens if token not in punct]
-        self.__dataframe['preprocessed_text'] = self.__dataframe['preprocessed_text'].progress_apply(_remove_punct)
+        self._apply(_build_remove_punct(self.cache))
 
     def remove_numerics(self):
         """Removes numeric values within token lists."""
         logger.info('remove numeric values...')
-        def _remove_numerics(tokens):
-            return [token for token in tokens if not token.isdigit()]
-        self.__dataframe['preprocessed_text'] = self.__dataframe['preprocessed_text'].progress_apply(_remove_numerics)
+        self._apply(_build_remove_numerics(self.cache))
 
     def remove_stopwords(self):
         """Removes all stop words within token lists."""
         logger.info('remove stopwords...')
-        # define list of stopwords
-        stop_words = stopwords.words('english')
-        additional_stop_words = ['u']
-        stop_words.extend(additional_stop_words)
-        def _remove_stopwords(tokens):
-            return [token for token in tokens if token not in stop_words and len(token) > 1]
-        self.__dataframe['preprocessed_text'] = self.__dataframe['preprocessed_text'].progress_apply(_remove_stopwords)
+        self._apply(_build_remove_stopwords(self.cache, self.additional_stop_words))
     
     def remove_emoji(self):
         """Removes all emojis within the token lists"""
         logger.info('remove emojis...')
-        def _remove_emoji(tokens):
-            return [token for token in tokens if not any(char in emoji.EMOJI_DATA for char in token)]
-        self.__dataframe['preprocessed_text'] = self.__dataframe['preprocessed_text'].progress_apply(_remove_emoji)
+        self._apply(_build_remove_emoji(self.cache))
 
     def lemmatize(self):
         """Performs a lemmatization of the tokens"""
         logger.info('lemmatize tokens...')
-        # initialization of the lemmatizer
-        lemmatizer = WordNetLemmatizer()
-        def _lemmatize(tokens):
-            return [lemmatizer.lemmatize(token) for token in tokens]
-        self.__dataframe['preprocessed_text'] = self.__dataframe['preprocessed_text'].progress_apply(_lemmatize)
-    
+        self._apply(_build_lemmatize(self.cache))
+
+    def run_fused(self, steps:list):
+        """Runs several preprocessing steps in a single pass.
+
+        The steps are composed into one function per document, so the intermediate
+        results of the individual steps are never materialised for the whole column.
+        The output is identical to calling the step methods one after the other.
+
+        Args:
+            steps (list): names of the preprocessing methods in execution order, e.g. ['remove_urls', 'tokenize_text']
+        """
+        logger.info(f'run fused preprocessing steps: {", ".join(steps)}...')
+        self._apply(compose_steps(steps, cache=self.cache, additional_stop_words=self.additional_stop_words))
+
+    def run_vectorised(self, steps:list, combine_patterns:bool=False):
+        """Runs several preprocessing steps with column level string operations where possible.
+
+        Url and mention removal are performed with the pandas string engine on an arrow backed
+        string column. Consecutive steps without a vectorised implementation, i.e. all steps on
+        token lists, are applied together in a single pass.
+
+        Note: The arrow regex engine (RE2) only treats ascii characters as letters, digits (\\w, \\b) and
+        whitespace (\\s, without \\v and \\x1c-\\x1f). Texts with characters that python's re treats
+        differently, e.g. 'naïve' or a non-breaking space, are therefore cleaned per row, so the result is
+        the same as that of the per row steps; benchmark_vectorised_steps reports the mismatches.
+
+        Args:
+            steps (list): names of the preprocessing methods in execution order
+            combine_patterns (bool, optional): strip urls and mentions with a single regex if both steps
+                follow each other; overlapping matches such as '@name.domain.com' are removed as a whole
+        """
+        logger.info(f'run vectorised preprocessing steps: {", ".join(steps)}...')
+        for group in _group_vectorised_steps(steps, combine_patterns):
+            if group[0] in _VECTORISED_STEPS:
+                logger.info(f'{group[0]} (vectorised)...')
+                self.__dataframe['preprocessed_text'] = _VECTORISED_STEPS[group[0]](self.__dataframe['preprocessed_text'])
+            else:
+                self.run_fused(group)
+
+    def run_parallel(self, steps:list, workers:int=None, chunksize:int=1000):
+        """Runs several preprocessing steps in a process pool.
+
+        The column is split into chunks, which are processed by the workers in a single pass each.
+        Every worker composes the steps only once, so stopwords and lemmatizer are initialised
+        once per process. The results are reassembled in the original order.
+        If the pipeline has a cache, every worker starts with a copy of it; the results computed by the
+        workers and their hits and misses are merged into the cache of the pipeline after every chunk.
+
+        Args:
+            steps (list): names of the preprocessing methods in execution order
+            workers (int, optional): number of worker processes; defaults to the number of cpu cores - 1
+            chunksize (int, optional): number of documents per chunk
+        """
+        if workers is None:
+            workers = max(multiprocessing.cpu_count()-1, 1)
+        logger.info(f'run preprocessing steps on {workers} processes: {", ".join(steps)}...')
+        documents = self.__dataframe['preprocessed_text'].tolist()
+        chunks = [documents[i:i+chunksize] for i in range(0, len(documents), chunksize)]
+        processed = []
+        with multiprocessing.Pool(processes=workers, initializer=_init_worker, initargs=(steps, self.cache, self.additional_stop_words)) as pool:
+            for chunk, cache_changes in tqdm(pool.imap(_process_chunk, chunks), total=len(chunks)):
+                processed.extend(chunk)
+                if cache_changes is not None:
+                    self.cache.update(*cache_changes)
+        self.__dataframe['preprocessed_text'] = pd.Series(processed, index=self.__dataframe.index)
+
+    def encode(self):
+        """Encodes the preprocessed token lists as integer arrays.
+
+        Returns:
+            corpus (EncodedCorpus): the token lists of the 'preprocessed_text' column in CSR layout
+        """
+        logger.info('encode preprocessed text...')
+        return EncodedCorpus.from_token_lists(tqdm(self.__dataframe['preprocessed_text']))
+
+    def _apply(self, function):
+        self.__dataframe['preprocessed_text'] = self.__dataframe['preprocessed_text'].progress_apply(function)
+
     def __get_dataframe(self):
         return self.__dataframe
     
@@ -139,27 +185,447 @@ class DefaultPipeline(PreprocessingPipeline):
     Attributes:
         dataframe: A pandas dataframe; The text to be processed must be in the 'rawContent' column.
     """
-    def __init__(self, dataframe:pd.DataFrame) -> None:
-        super().__init__(dataframe)
+    steps = ['remove_urls', 'remove_mentions', 'fix_contractions', 'tokenize_text', 'lowercase',
+             'remove_punct', 'remove_numerics', 'remove_stopwords', 'remove_emoji', 'lemmatize']
+
+    def __init__(self, dataframe:pd.DataFrame, cache=None, additional_stop_words:list=None) -> None:
+        super().__init__(dataframe, cache, additional_stop_words)
     
-    def run(self):
+    def run(self, fused:bool=False, parallel:bool=False, vectorised:bool=False, workers:int=None):
         """Runs the preprocessing pipeline.
 
         Executes the previously specified methods of the pipeline
+
+        Args:
+            fused (bool, optional): apply all steps in a single pass over the data instead of one pass per step
+            parallel (bool, optional): apply all steps in a process pool; implies a single pass per chunk
+            vectorised (bool, optional): use column level string operations for the regex steps
+            workers (int, optional): number of worker processes for the parallel mode
         
         Returns:
             dataframe (pd.DataFrame): the pandas dataframe, with the 'preprocessed_text' column containing the processed text
         """
         logger.warning('starting default preprocessing pipeline')
-        self.remove_urls()
-        self.remove_mentions()
-        self.fix_contractions()
-        self.tokenize_text()
-        self.lowercase()
-        self.remove_punct()
-        self.remove_numerics()
-        self.remove_stopwords()
-        self.remove_emoji()
-        self.lemmatize()
+        if parallel:
+            self.run_parallel(self.steps, workers=workers)
+        elif vectorised:
+            self.run_vectorised(self.steps)
+        elif fused:
+            self.run_fused(self.steps)
+        else:
+            for step in self.steps:
+                getattr(self, step)()
+        if self.cache is not None:
+            logger.info(f'token cache: {self.cache.hits} hits, {self.cache.misses} misses, {len(self.cache)} entries')
         logger.info('preprocessing completed successfully!')
-        return self.dataframe
\ No newline at end of file
+        return self.dataframe
+
+
+def run_streaming(source:str, destination:str, steps:list=None, batch_size:int=65536, cache=None, additional_stop_words:list=None):
+    """Runs the preprocessing pipeline batch by batch from file to file.
+
+    The source file is read in record batches; each batch is preprocessed in a single pass and
+    appended to the destination file. Peak memory is therefore bounded by the batch size instead
+    of the size of the corpus. Feather and parquet files are supported, the format is derived from
+    the file extension.
+
+    Args:
+        source (str): path to the .FEATHER or .PARQUET file; the text must be in the 'rawContent' column
+        destination (str): path to the output .FEATHER or .PARQUET file
+        steps (list, optional): names of the preprocessing steps; defaults to the steps of the DefaultPipeline
+        batch_size (int, optional): maximum number of rows per batch
+        cache (TokenCache, optional): cache for token level results
+        additional_stop_words (list, optional): stop words in addition to the nltk list
+    """
+    logger.warning('starting streaming preprocessing pipeline')
+    _download_nltk_packages()
+    function = compose_steps(steps or DefaultPipeline.steps, cache=cache, additional_stop_words=additional_stop_words)
+
+    reader_schema, batches = _read_batches(source, batch_size)
+    field = pa.field('preprocessed_text', pa.list_(pa.string()))
+    index = reader_schema.get_field_index('preprocessed_text')
+    # the column of an already preprocessed file is replaced
+    schema = reader_schema.set(index, field) if index >= 0 else reader_schema.append(field)
+    writer = _open_writer(destination, schema)
+    try:
+        for batch in tqdm(batches):
+            df = batch.to_pandas()
+            df['preprocessed_text'] = df['rawContent'].map(function)
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+    finally:
+        writer.close()
+    logger.info('preprocessing completed successfully!')
+
+
+def _read_batches(path:str, batch_size:int):
+    if os.path.splitext(path)[1] == '.parquet':
+        parquet_file = pq.ParquetFile(path)
+        return parquet_file.schema_arrow, parquet_file.iter_batches(batch_size=batch_size)
+    # feather files (v2) are arrow ipc files and can be read batch by batch
+    reader = pa.ipc.open_file(path)
+    def _batches():
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for offset in range(0, batch.num_rows, batch_size):
+                yield batch.slice(offset, batch_size)
+    return reader.schema, _batches()
+
+
+def _open_writer(path:str, schema:pa.Schema):
+    if os.path.splitext(path)[1] == '.parquet':
+        return pq.ParquetWriter(path, schema)
+    return pa.ipc.new_file(path, schema)
+
+
+def _download_nltk_packages():
+    # download required nltk packages
+    nltk.download('punkt')
+    nltk.download('stopwords')
+    nltk.download('wordnet')
+
+
+class TokenCache:
+    """A bounded cache for token level preprocessing results.
+
+    Tweet vocabularies are highly skewed, so most token occurrences repeat a few distinct tokens.
+    The cache stores the result of a step for each distinct token and discards the least recently
+    used entries once the maximum size is reached. It can be saved and reused in later runs.
+
+    Attributes:
+        maxsize: maximum number of cached results
+        hits: number of lookups answered from the cache
+        misses: number of lookups that had to be computed
+    """
+    def __init__(self, maxsize:int=1000000) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # results, hits and misses since the last take_changes; results are only recorded after its first call
+        self._new_entries = None
+        self._last_hits = 0
+        self._last_misses = 0
+
+    def lookup(self, step:str, token:str, function):
+        """Returns the cached result of a step for a token, computing it with function if necessary."""
+        key = (step, token)
+        try:
+            result = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            result = self._entries[key] = function(token)
+            if self._new_entries is not None:
+                self._new_entries.append((key, result))
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False) # discard least recently used entry
+            return result
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return result
+
+    def update(self, entries:list, hits:int=0, misses:int=0):
+        """Adds results and lookup statistics of another cache, e.g. of a worker process."""
+        self.hits += hits
+        self.misses += misses
+        for key, result in entries:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False) # discard least recently used entry
+
+    def take_changes(self):
+        """Returns the results computed and the hits and misses counted since the last call, e.g. in a worker process."""
+        changes = (self._new_entries or [], self.hits - self._last_hits, self.misses - self._last_misses)
+        self._new_entries, self._last_hits, self._last_misses = [], self.hits, self.misses
+        return changes
+
+    def save(self, path:str):
+        """Saves the cached results as a .pkl file."""
+        safe_as_pkl({'maxsize': self.maxsize, 'entries': list(self._entries.items())}, path)
+
+    @classmethod
+    def load(cls, path:str, maxsize:int=None):
+        """Loads cached results of an earlier run from a .pkl file."""
+        data = load_pkl(path)
+        cache = cls(maxsize=maxsize or data['maxsize'])
+        for key, result in data['entries'][-cache.maxsize:]:
+            cache._entries[key] = result
+        return cache
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _memoise(cache, step:str, function):
+    # wraps a per token function with the cache, if one is given
+    if cache is None:
+        return function
+    def _cached(token):
+        return cache.lookup(step, token, function)
+    return _cached
+
+
+# - Step functions
+# Each builder returns a function that performs one preprocessing step on a single document.
+# The builders are shared by the step methods of the pipeline and the fused execution mode.
+# define regex patterns for url and user mention detection
+URL_PATTERN = r'\b(?:https?://)?(?:[a-z]+\.[a-z]+\.[a-z]+|[a-z]+\.[a-z]+(?:/[^\s]*)?)\b'
+MENTION_PATTERN = r'@\w+'
+
+
+def _build_remove_urls(cache=None):
+    url_pattern = re.compile(URL_PATTERN)
+    def _remove_urls(text):
+        # remove url matches from the text
+        return url_pattern.sub('', text)
+    return _remove_urls
+
+
+def _build_remove_mentions(cache=None):
+    mention_pattern = re.compile(MENTION_PATTERN)
+    def _remove_mentions(text):
+        # remove user mentions from the text
+        return mention_pattern.sub('', text)
+    return _remove_mentions
+
+
+def _build_fix_contractions(cache=None):
+    def _fix_contractions(text):
+        try:
+            return contractions.fix(text)
+        except IndexError: # error should not appear
+            return text
+    return _fix_contractions
+
+
+def _build_tokenize_text(cache=None):
+    # define tokenizer function
+    tokenizer = WordPunctTokenizer()
+    def _tokenize_text(text):
+        return tokenizer.tokenize(text)
+    return _tokenize_text
+
+
+def _build_lowercase(cache=None):
+    lower = _memoise(cache, 'lowercase', str.lower)
+    def _lowercase(tokens):
+        return [lower(token) for token in tokens]
+    return _lowercase
+
+
+def _build_remove_punct(cache=None):
+    return _build_token_filter(['remove_punct'], cache)
+
+
+def _build_remove_numerics(cache=None):
+    return _build_token_filter(['remove_numerics'], cache)
+
+
+def _build_remove_stopwords(cache=None, additional_stop_words:list=None):
+    return _build_token_filter(['remove_stopwords'], cache, additional_stop_words)
+
+
+def _build_remove_emoji(cache=None):
+    return _build_token_filter(['remove_emoji'], cache)
+
+
+def _build_lemmatize(cache=None):
+    # initialization of the lemmatizer
+    lemmatizer = WordNetLemmatizer()
+    lemmatize = _memoise(cache, 'lemmatize', lemmatizer.lemmatize)
+    def _lemmatize(tokens):
+        return [lemmatize(token) for token in tokens]
+    return _lemmatize
+
+
+_STEP_BUILDERS = {
+    'remove_urls': _build_remove_urls,
+    'remove_mentions': _build_remove_mentions,
+    'fix_contractions': _build_fix_contractions,
+    'tokenize_text': _build_tokenize_text,
+    'lowercase': _build_lowercase,
+    'remove_punct': _build_remove_punct,
+    'remove_numerics': _build_remove_numerics,
+    'remove_stopwords': _build_remove_stopwords,
+    'remove_emoji': _build_remove_emoji,
+    'lemmatize': _build_lemmatize,
+}
+
+
+# - Token filters
+# Filter steps only decide whether a token is kept, so consecutive filter steps can be merged
+# into a single filter that classifies every token with one lookup.
+ADDITIONAL_STOP_WORDS = ['u']
+
+# adding more characters to the punctuation list
+PUNCTUATION = frozenset(list(string.punctuation) + ["’", "``", "`", "''", "'", "•", "“", "”", "…", "�", "‘", "/…", "-…", "-#", "...", ".”", "!!"])
+
+
+def _build_drop_rule(step:str, additional_stop_words:list=None):
+    # returns a function that decides whether a token is dropped by the filter step
+    if step == 'remove_punct':
+        return PUNCTUATION.__contains__
+    if step == 'remove_numerics':
+        return str.isdigit
+    if step == 'remove_stopwords':
+        # define set of stopwords
+        stop_words = frozenset(stopwords.words('english') + list(ADDITIONAL_STOP_WORDS if additional_stop_words is None else additional_stop_words))
+        return lambda token: token in stop_words or len(token) <= 1
+    if step == 'remove_emoji':
+        # only single characters can match a character of the token
+        emoji_chars = frozenset(key for key in emoji.EMOJI_DATA if len(key) == 1)
+        return lambda token: not emoji_chars.isdisjoint(token)
+    raise ValueError(f'{step} is not a token filter step')
+
+
+def _build_token_filter(steps:list, cache=None, additional_stop_words:list=None):
+    rules = tuple(_build_drop_rule(step, additional_stop_words) for step in steps)
+    def _drop_token(token):
+        for rule in rules:
+            if rule(token):
+                return True
+        return False
+    drop_token = _memoise(cache, '+'.join(steps), _drop_token)
+    def _filter_tokens(tokens):
+        return [token for token in tokens if not drop_token(token)]
+    return _filter_tokens
+
+
+_FILTER_STEPS = ('remove_punct', 'remove_numerics', 'remove_stopwords', 'remove_emoji')
+
+
+def compose_steps(steps:list, cache=None, additional_stop_words:list=None):
+    """Composes preprocessing steps into a single function.
+
+    Consecutive token filter steps are merged into one filter.
+
+    Args:
+        steps (list): names of the preprocessing steps in execution order
+        cache (TokenCache, optional): cache for token level results
+        additional_stop_words (list, optional): stop words in addition to the nltk list; defaults to ADDITIONAL_STOP_WORDS
+
+    Returns:
+        function that applies all steps to a single document
+    """
+    functions = []
+    filter_steps = []
+    for step in list(steps) + [None]:
+        if step in _FILTER_STEPS:
+            filter_steps.append(step)
+            continue
+        if filter_steps:
+            functions.append(_build_token_filter(filter_steps, cache, additional_stop_words))
+            filter_steps = []
+        if step is not None:
+            functions.append(_STEP_BUILDERS[step](cache))
+    def _process_document(document):
+        for function in functions:
+            document = function(document)
+        return document
+    return _process_document
+
+
+# - Vectorised step functions
+# Each function performs one preprocessing step on the whole column at once.
+_STRING_DTYPE = pd.StringDtype('pyarrow')
+# non-ascii letters, numbers and separators and the ascii characters that only python counts as whitespace
+_RE2_DIVERGENT_PATTERN = r'[^\x00-\x7f\PL]|[^\x00-\x7f\PN]|[^\x00-\x7f\PZ]|[\x0b\x1c-\x1f\x85]'
+
+def _vectorised_sub(texts:pd.Series, pattern:str):
+    # removes the matches of pattern with RE2; texts on which RE2 and python's re can differ are cleaned per row
+    strings = texts.astype(_STRING_DTYPE)
+    per_row = strings.str.contains(_RE2_DIVERGENT_PATTERN, regex=True).fillna(False).astype(bool)
+    if not per_row.any():
+        return strings.str.replace(pattern, '', regex=True).astype(object)
+    result = texts.astype(object).copy()
+    result[~per_row] = strings[~per_row].str.replace(pattern, '', regex=True).astype(object)
+    compiled_pattern = re.compile(pattern)
+    result[per_row] = texts[per_row].map(lambda text: compiled_pattern.sub('', text))
+    return result
+
+
+def _vectorised_remove_urls(texts:pd.Series):
+    return _vectorised_sub(texts, URL_PATTERN)
+
+
+def _vectorised_remove_mentions(texts:pd.Series):
+    return _vectorised_sub(texts, MENTION_PATTERN)
+
+
+def _vectorised_remove_urls_and_mentions(texts:pd.Series):
+    return _vectorised_sub(texts, f'{URL_PATTERN}|{MENTION_PATTERN}')
+
+
+_VECTORISED_STEPS = {
+    'remove_urls': _vectorised_remove_urls,
+    'remove_mentions': _vectorised_remove_mentions,
+    'remove_urls_and_mentions': _vectorised_remove_urls_and_mentions,
+}
+
+
+def _group_vectorised_steps(steps:list, combine_patterns:bool=False):
+    # vectorised steps stand alone, all other consecutive steps are grouped for a fused pass
+    groups = []
+    for step in steps:
+        if combine_patterns and step == 'remove_mentions' and groups and groups[-1] == ['remove_urls']:
+            groups[-1] = ['remove_urls_and_mentions']
+        elif step in _VECTORISED_STEPS or not groups or groups[-1][0] in _VECTORISED_STEPS:
+            groups.append([step])
+        else:
+            groups[-1].append(step)
+    return groups
+
+
+def benchmark_vectorised_steps(dataframe:pd.DataFrame, repeat:int=3):
+    """Compares the vectorised step functions with the per row implementation.
+
+    Besides the runtimes, the number of texts for which the vectorised step returns another text than the
+    per row step is reported (a parity check; the combined step is compared with the combined pattern).
+
+    Args:
+        dataframe (pd.DataFrame): the text to be processed must be in the 'rawContent' column
+        repeat (int, optional): number of measurements per step; the fastest one is reported
+
+    Returns:
+        result_df (pd.DataFrame): runtimes in seconds per step, the resulting speedup and the number of mismatches
+    """
+    texts = dataframe['rawContent'].copy()
+
+    def _measure(function, data):
+        runtimes = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            function(data)
+            runtimes.append(time.perf_counter() - start_time)
+        return min(runtimes)
+
+    result_df = pd.DataFrame(columns=['step', 'per_row', 'vectorised', 'mismatches'])
+    for step, function in _VECTORISED_STEPS.items():
+        per_row_steps = ['remove_urls', 'remove_mentions'] if step == 'remove_urls_and_mentions' else [step]
+        per_row = compose_steps(per_row_steps)
+        combined_pattern = re.compile(f'{URL_PATTERN}|{MENTION_PATTERN}')
+        reference = texts.map(per_row) if step != 'remove_urls_and_mentions' else texts.map(lambda text: combined_pattern.sub('', text))
+        result_df.loc[len(result_df)] = {'step': step,
+                                         'per_row': _measure(lambda data: data.map(per_row), texts),
+                                         'vectorised': _measure(function, texts),
+                                         'mismatches': int((function(texts) != reference).sum())}
+    result_df['speedup'] = result_df['per_row'] / result_df['vectorised']
+    return result_df
+
+
+# - Process pool workers
+_worker_function = None
+_worker_cache = None
+
+def _init_worker(steps:list, cache=None, additional_stop_words:list=None):
+    # compose the steps once per worker process
+    global _worker_function, _worker_cache
+    _worker_function = compose_steps(steps, cache=cache, additional_stop_words=additional_stop_words)
+    _worker_cache = cache
+    if cache is not None:
+        cache.take_changes() # only changes made by the worker are sent back
+
+
+def _process_chunk(documents:list):
+    processed = [_worker_function(document) for document in documents]
+    return processed, _worker_cache.take_changes() if _worker_cache is not None else None
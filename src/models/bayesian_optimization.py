@@ -1,29 +1,47 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import argparse
+import multiprocessing
 import time
+import os
 
+import numpy as np
 import pandas as pd
-from hyperopt import fmin, tpe, space_eval
+from hyperopt import fmin, tpe, space_eval, base, Trials, STATUS_OK
+from hyperopt.pyll import stochastic
 from sklearn.metrics import mean_absolute_error
+from threadpoolctl import threadpool_limits # installed with scikit-learn
 
+from src.features.encoded_corpus import EncodedCorpus
 from src.models import topic_modeling as tm
+from src.models.coherence import CoherenceScorer
 from src.models import time_series_forecasting as tsf
 from src.utils import logger, load_pkl
 
 
-def optimize_topic_modeling(path_tweets_processed:pd.DataFrame, search_space:dict, max_evals:int):
+def optimize_topic_modeling(path_tweets_processed:pd.DataFrame, search_space:dict, max_evals:int, parallel_trials:int=1,
+                            cache_dir:str=None):
     """Performs hyperparameter optimization for topic modeling.
 
     For this purpose, a bayesian optimization is performed.
+    With parallel_trials > 1, several parameter combinations are evaluated at the same time in a process pool;
+    the available cores are divided between the trials.
+    The word co-occurrences needed for the coherence scores are counted only once (see CoherenceScorer).
+    With a cache folder, e.g. data/modeling/cache, the dictionary, the corpus and the coherence statistics
+    are built only on the first run with the same data.
 
     Args:
-        path_tweets_processed (pd.DataFrame): path to the .FEATHER file of the preprocessed data
+        path_tweets_processed (pd.DataFrame): path to the .FEATHER file of the preprocessed data or to a saved EncodedCorpus folder
         search_space (dict): a defined search space that can be used by hyperopt
         max_evals (int): number of maximum evaluations
+        parallel_trials (int, optional): number of parameter combinations evaluated concurrently
+        cache_dir (str, optional): folder in which dictionary, corpus and coherence statistics are cached between runs
     
     Returns:
         result_df (pd.DataFrame): the results of the individual runs as a data frame
         optimized_parameters (dict): the optimized parameters
     """
+    if parallel_trials > 1:
+        return _optimize_topic_modeling_parallel(path_tweets_processed, search_space, max_evals, parallel_trials, cache_dir)
     
     def _target_function(parameter_combination:dict):
         logger.info(f'Model #{len(result_df)}/{max_evals-1}; parameters: {str(parameter_combination)}')
@@ -31,7 +49,7 @@ def optimize_topic_modeling(path_tweets_processed:pd.DataFrame, search_space:dic
         start_time = time.time()
 
         lda_model.build(seed=int(time.time()), **parameter_combination)
-        cs = tm.evaluate(model=lda_model.model, text=lda_model.text, dictionary=lda_model.dictionary)
+        cs = tm.evaluate(model=lda_model.model, text=lda_model.text, dictionary=lda_model.dictionary, scorer=scorer)
 
         result_df.loc[len(result_df)] = {**{'seed': lda_model.seed}, **{k: str(v) for k, v in parameter_combination.items()}, **{'coherence_score': cs}}
         result_df.to_feather('tm_ht_results.feather')
@@ -45,8 +63,7 @@ def optimize_topic_modeling(path_tweets_processed:pd.DataFrame, search_space:dic
         return -cs# value to optimize; negate for maximization
 
     logger.info('Initialize bayesian optimization')
-    text_data = pd.read_feather(path_tweets_processed)['preprocessed_text']
-    lda_model = tm.LdaMulticoreModel(text=text_data)
+    lda_model, scorer = _load_model_and_scorer(path_tweets_processed, cache_dir)
 
     logger.info('create result dataframe...')
     result_df = pd.DataFrame(columns=['seed'] + list(search_space.keys()) + ['coherence_score'])
@@ -57,6 +74,161 @@ def optimize_topic_modeling(path_tweets_processed:pd.DataFrame, search_space:dic
     return result_df, optimized_parameters
 
 
+def _optimize_topic_modeling_parallel(path_tweets_processed:str, search_space:dict, max_evals:int, parallel_trials:int,
+                                      cache_dir:str=None):
+    # hyperopt's fmin evaluates one trial at a time; here TPE suggests the next parameter combination
+    # as soon as a worker becomes free, based on all trials completed so far
+    cores_per_trial = max(1, (multiprocessing.cpu_count() - 1) // parallel_trials)
+    logger.info(f'Initialize bayesian optimization; {parallel_trials} parallel trials with {cores_per_trial} cores each')
+    if cache_dir is not None:
+        _load_model_and_scorer(path_tweets_processed, cache_dir) # build the caches once instead of in every worker
+    result_df = pd.DataFrame(columns=['seed'] + list(search_space.keys()) + ['coherence_score'])
+    trials = Trials()
+    domain = base.Domain(lambda parameter_combination: None, search_space)
+    rstate = np.random.default_rng()
+
+    logger.warning('start bayesian optimization algorithm... \n')
+    running_trials = {}
+    number_of_started_trials = 0
+    # the processes of the pool must not be daemonic, because LdaMulticore starts its own worker processes
+    with ProcessPoolExecutor(max_workers=parallel_trials, initializer=_init_trial_worker,
+                             initargs=(path_tweets_processed, cores_per_trial, cache_dir)) as executor:
+        while number_of_started_trials < max_evals or running_trials:
+            while number_of_started_trials < max_evals and len(running_trials) < parallel_trials:
+                trials.refresh()
+                new_ids = trials.new_trial_ids(1)
+                trial = tpe.suggest(new_ids, domain, trials, int(rstate.integers(2**31 - 1)))[0]
+                parameter_combination = space_eval(search_space, base.spec_from_misc(trial['misc']))
+                logger.info(f'Model #{number_of_started_trials}/{max_evals-1}; parameters: {str(parameter_combination)}')
+                future = executor.submit(_run_trial, parameter_combination, int(time.time()) + new_ids[0])
+                running_trials[future] = (trial, parameter_combination)
+                number_of_started_trials += 1
+
+            done, _ = wait(running_trials, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial, parameter_combination = running_trials.pop(future)
+                seed, cs, calculation_time = future.result()
+                trial['state'] = base.JOB_STATE_DONE
+                trial['result'] = {'loss': -cs, 'status': STATUS_OK} # negate for maximization
+                trials.insert_trial_docs([trial])
+
+                result_df.loc[len(result_df)] = {**{'seed': seed}, **{k: str(v) for k, v in parameter_combination.items()}, **{'coherence_score': cs}}
+                result_df.to_feather('tm_ht_results.feather')
+                logger.info(f'Model finished: coherence score {cs}; calculation time: {calculation_time} min')
+                logger.info(f'Currently best value: {result_df["coherence_score"].max()}\n')
+
+    trials.refresh()
+    return result_df, trials.argmin
+
+
+_trial_model = None # model of a worker process of the parallel optimization
+_trial_scorer = None
+
+def _init_trial_worker(path_tweets_processed:str, cores:int, cache_dir:str=None):
+    global _trial_model, _trial_scorer
+    # the cores are divided between the trials: LdaMulticore starts cores worker processes, and the BLAS threads
+    # used by the coherence scorer (and inherited by the LdaMulticore workers) are limited to the same number
+    threadpool_limits(limits=cores)
+    _trial_model, _trial_scorer = _load_model_and_scorer(path_tweets_processed, cache_dir)
+    _trial_model.cores = cores
+
+
+def _run_trial(parameter_combination:dict, seed:int):
+    start_time = time.time()
+    _trial_model.build(seed=seed, **parameter_combination)
+    cs = tm.evaluate(model=_trial_model.model, text=_trial_model.text, dictionary=_trial_model.dictionary, scorer=_trial_scorer)
+    return seed, cs, round((time.time() - start_time) / 60, 2)
+
+
+def _load_model_and_scorer(path_tweets_processed:str, cache_dir:str=None):
+    corpus_cache_dir = os.path.join(cache_dir, 'corpus') if cache_dir is not None else None
+    coherence_cache_dir = os.path.join(cache_dir, 'coherence') if cache_dir is not None else None
+    lda_model = tm.LdaMulticoreModel(text=_load_text_data(path_tweets_processed), cache_dir=corpus_cache_dir)
+    scorer = CoherenceScorer(lda_model.text, lda_model.dictionary, cache_dir=coherence_cache_dir)
+    return lda_model, scorer
+
+
+def _load_text_data(path_tweets_processed:str):
+    if os.path.isdir(path_tweets_processed):
+        return EncodedCorpus.load(path_tweets_processed)
+    return pd.read_feather(path_tweets_processed)['preprocessed_text']
+
+
+def optimize_topic_modeling_successive_halving(path_tweets_processed:str, search_space:dict, n_candidates:int=27,
+                                               eta:int=3, max_passes:int=1, seed:int=None, cache_dir:str=None):
+    """Performs hyperparameter optimization for topic modeling with successive halving.
+
+    Randomly sampled parameter combinations are first trained with only a fraction of their passes and scored.
+    After each rung only the best 1/eta of the candidates are kept; their models are trained further
+    (resumed, not refitted) until the survivors of the last rung have received all of their passes.
+
+    Args:
+        path_tweets_processed (str): path to the .FEATHER file of the preprocessed data or to a saved EncodedCorpus folder
+        search_space (dict): a defined search space that can be used by hyperopt
+        n_candidates (int, optional): number of parameter combinations in the first rung
+        eta (int, optional): reduction factor between two rungs
+        max_passes (int, optional): full number of passes if the search space does not contain 'passes';
+            raises ValueError if no candidate has more than one pass, since the rungs would not differ
+        seed (int, optional): seed of the sampling and the models
+        cache_dir (str, optional): folder in which dictionary, corpus and coherence statistics are cached between runs
+
+    Returns:
+        result_df (pd.DataFrame): the results of each candidate in each rung as a data frame
+        optimized_parameters (dict): the parameters of the best candidate
+    """
+    seed = int(time.time()) if seed is None else seed
+    rng = np.random.default_rng(seed)
+    number_of_rungs = 1
+    while eta ** number_of_rungs <= n_candidates:
+        number_of_rungs += 1
+
+    candidates = []
+    for i in range(n_candidates):
+        parameter_combination = stochastic.sample(search_space, rng=rng)
+        passes = int(parameter_combination.pop('passes', max_passes))
+        candidates.append({'parameters': parameter_combination, 'passes': passes, 'seed': seed + i,
+                           'trained_passes': 0, 'model': None, 'coherence_score': None})
+    if all(candidate['passes'] <= 1 for candidate in candidates):
+        # every rung would score the models of the first rung again
+        raise ValueError("successive halving needs candidates with more than one pass; add 'passes' to the search space or increase max_passes")
+
+    logger.info('Initialize successive halving')
+    lda_model, scorer = _load_model_and_scorer(path_tweets_processed, cache_dir)
+    result_df = pd.DataFrame(columns=['rung', 'seed'] + [k for k in search_space.keys() if k != 'passes'] + ['passes', 'trained_passes', 'coherence_score'])
+
+    for rung in range(number_of_rungs):
+        logger.warning(f'rung {rung+1}/{number_of_rungs}: {len(candidates)} candidates\n')
+        for candidate in candidates:
+            # every candidate receives its full number of passes in the last rung
+            target_passes = max(1, round(candidate['passes'] / eta ** (number_of_rungs - 1 - rung)))
+            if target_passes > candidate['trained_passes']:
+                logger.info(f'parameters: {str(candidate["parameters"])}; passes: {target_passes}/{candidate["passes"]}')
+                if candidate['model'] is None:
+                    lda_model.build(seed=candidate['seed'], passes=target_passes, **candidate['parameters'])
+                else:
+                    lda_model.model = candidate['model']
+                    lda_model.build(resume=True, passes=target_passes - candidate['trained_passes'])
+                candidate['model'] = lda_model.model
+                candidate['trained_passes'] = target_passes
+                candidate['coherence_score'] = tm.evaluate(model=lda_model.model, text=lda_model.text, dictionary=lda_model.dictionary, scorer=scorer)
+            result_df.loc[len(result_df)] = {**{'rung': rung, 'seed': candidate['seed']},
+                                             **{k: str(v) for k, v in candidate['parameters'].items()},
+                                             **{'passes': str(candidate['passes']), 'trained_passes': candidate['trained_passes'],
+                                                'coherence_score': candidate['coherence_score']}}
+            result_df.to_feather('tm_sh_results.feather')
+
+        candidates.sort(key=lambda candidate: candidate['coherence_score'], reverse=True)
+        if rung < number_of_rungs - 1:
+            for candidate in candidates[max(1, len(candidates) // eta):]:
+                candidate['model'] = None # reclaim memory
+            candidates = candidates[:max(1, len(candidates) // eta)]
+        logger.info(f'Currently best value: {candidates[0]["coherence_score"]}\n')
+
+    optimized_parameters = {**candidates[0]['parameters'], 'passes': candidates[0]['passes']}
+    logger.info(f'Done. Optimized parameters: {str(optimized_parameters)}')
+    return result_df, optimized_parameters
+
+
 def optimize_xgb_modeling(xgb_model:tsf.XGBoostModel2, search_space:dict, max_evals:int):
     """Performs hyperparameter optimization for xgb modeling.
 
@@ -89,10 +261,12 @@ if __name__ == '__main__':
     parser.add_argument('--path_dataframe', required=True, help='')
     parser.add_argument('--path_params', required=True, help='')
     parser.add_argument('--max_evals', required=True, help='')
+    parser.add_argument('--parallel_trials', default=1, help='number of parameter combinations evaluated concurrently')
+    parser.add_argument('--cache_dir', default=None, help='folder in which dictionary, corpus and coherence statistics are cached')
     args, unknown = parser.parse_known_args()
 
     search_space = load_pkl(args.path_params)
 
-    optimize_topic_modeling(args.path_dataframe, search_space, int(args.max_evals))
+    optimize_topic_modeling(args.path_dataframe, search_space, int(args.max_evals), int(args.parallel_trials), args.cache_dir)
 
-# python bayesian_optimization.py --path_dataframe '../../data/processed/twitter_tweets_processed.feather' --path_params '../../data/modeling/tm_ht_search_space.pkl' --max_evals 200
+# python bayesian_optimization.py --path_dataframe '../../data/processed/twitter_tweets_processed.feather' --path_params '../../data/modeling/tm_ht_search_space.pkl' --max_evals 200 --cache_dir '../../data/modeling/cache'
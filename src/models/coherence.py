@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import shutil
+
+import numpy as np
+from gensim import matutils
+from scipy import sparse
+
+from src.utils import logger
+
+
+EPSILON = 1e-12 # same smoothing as gensim's direct confirmation measures
+
+
+class CoherenceScorer:
+    """Calculates the c_v coherence of topic models from precomputed corpus statistics.
+
+    gensim's CoherenceModel slides a window over all texts for every model that is evaluated. The scorer
+    does this only once: it stores for every window the set of dictionary words it contains as a sparse
+    boolean window-term matrix. The (co-)occurrence counts of the top words of any model are then a single
+    sparse matrix product. The windows follow gensim's boolean sliding window exactly, so the scores are
+    the same as those of CoherenceModel(coherence='c_v').
+    With a cache folder the matrix is saved under a fingerprint of the texts, the dictionary and the
+    window size, and loaded (memory-mapped) on the next run.
+
+    Attributes:
+        window_size: size of the sliding window (c_v: 110)
+        topn: number of top words per topic
+        num_windows: number of windows of the corpus
+    """
+    def __init__(self, text, dictionary, window_size:int=110, topn:int=20, cache_dir:str=None) -> None:
+        self.window_size = window_size
+        self.topn = topn
+        self._matrix = None
+        path = None
+        if cache_dir is not None:
+            path = os.path.join(cache_dir, self.fingerprint(text, dictionary, window_size))
+            if os.path.isdir(path):
+                logger.info(f'load coherence statistics from {path}...')
+                self._matrix = self._load(path)
+        if self._matrix is None:
+            logger.info('calculate coherence statistics...')
+            self._matrix = self._window_term_matrix(text, dictionary, window_size)
+            if path is not None:
+                self._save(path)
+        self.num_windows = self._matrix.shape[0]
+
+    def score(self, model):
+        """Returns the c_v coherence score of a topic model (mean over its topics)."""
+        return float(np.mean(self.topic_scores(model)))
+
+    def scores(self, models:list, workers:int=1):
+        """Returns the c_v coherence scores of several topic models, optionally calculated by several threads."""
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.score, models))
+
+    def topic_scores(self, model):
+        """Returns the c_v coherence of each topic of a model.
+
+        Args:
+            model (gensim.models.LdaModel): topic model; alternatively a list of arrays of top word ids
+
+        Returns:
+            scores (np.ndarray): coherence of each topic
+        """
+        if isinstance(model, list):
+            topics = [np.asarray(topic) for topic in model]
+        else:
+            topics = [matutils.argsort(topic, topn=self.topn, reverse=True) for topic in model.get_topics()]
+        word_ids = np.unique(np.concatenate(topics))
+        positions = {word_id: i for i, word_id in enumerate(word_ids.tolist())}
+        occurrences = self._matrix[:, word_ids]
+        co_occurrences = (occurrences.T @ occurrences).toarray().astype(np.float64) # diagonal: occurrences
+        probabilities = co_occurrences / self.num_windows
+        with np.errstate(divide='ignore', invalid='ignore'):
+            word_probabilities = np.diag(probabilities)
+            # normalised pointwise mutual information of all pairs of top words
+            npmi = np.log((probabilities + EPSILON) / np.outer(word_probabilities, word_probabilities))
+            npmi /= -np.log(probabilities + EPSILON)
+
+            scores = np.empty(len(topics))
+            for i, topic in enumerate(topics):
+                index = [positions[word_id] for word_id in topic.tolist()]
+                # context vectors of the single words (W') and of the whole topic (W*)
+                context_vectors = npmi[np.ix_(index, index)]
+                topic_vector = context_vectors.sum(axis=0)
+                similarities = context_vectors @ topic_vector / (np.linalg.norm(context_vectors, axis=1) * np.linalg.norm(topic_vector))
+                scores[i] = similarities.mean()
+        return scores
+
+    @staticmethod
+    def fingerprint(text, dictionary, window_size:int):
+        """Returns a hash of the texts, the dictionary and the window size."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str(window_size).encode())
+        for token_id in range(len(dictionary)):
+            h.update(dictionary[token_id].encode('utf-8') + b'\x00')
+        for document in text:
+            h.update('\x00'.join(document).encode('utf-8') + b'\x01')
+        return h.hexdigest()
+
+    @staticmethod
+    def _window_term_matrix(text, dictionary, window_size:int):
+        # one row per window with the dictionary words of the window; like gensim, texts shorter than the window
+        # form a single window, and the words of a sliding window are updated at its edges only
+        indices = []
+        indptr = [0]
+        for document in text:
+            ids = dictionary.doc2idx(list(document))
+            if len(ids) <= window_size:
+                windows = [set(ids)]
+            else:
+                window = set(ids[:window_size])
+                windows = [set(window)]
+                for start in range(1, len(ids) - window_size + 1):
+                    window.discard(ids[start - 1])
+                    window.add(ids[start + window_size - 1])
+                    windows.append(set(window))
+            for window in windows:
+                window.discard(-1) # words that are not in the dictionary
+                indices.extend(window)
+                indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.int32)
+        matrix = sparse.csr_matrix((data, np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+                                   shape=(len(indptr) - 1, len(dictionary)))
+        return matrix.tocsc()
+
+    def _save(self, path:str):
+        # the folder is renamed when complete, so an interrupted save is never loaded;
+        # several processes may save the same statistics at the same time
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        os.makedirs(temporary_path, exist_ok=True)
+        np.save(os.path.join(temporary_path, 'indices.npy'), self._matrix.indices)
+        np.save(os.path.join(temporary_path, 'indptr.npy'), self._matrix.indptr)
+        np.save(os.path.join(temporary_path, 'shape.npy'), np.array(self._matrix.shape))
+        try:
+            os.replace(temporary_path, path)
+        except OSError: # saved by another process in the meantime
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+    @staticmethod
+    def _load(path:str):
+        indices = np.load(os.path.join(path, 'indices.npy'), mmap_mode='r')
+        indptr = np.load(os.path.join(path, 'indptr.npy'), mmap_mode='r')
+        shape = tuple(np.load(os.path.join(path, 'shape.npy')).tolist())
+        return sparse.csc_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr), shape=shape)
@@ -1,7 +1,21 @@
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
 import time
 import multiprocessing
+import weakref
 
-from gensim import corpora, models
+import numpy as np
+from gensim import corpora, matutils, models, utils
+from scipy import sparse
+from src.features.encoded_corpus import EncodedCorpus
+from src.models.coherence import CoherenceScorer
 from src.utils import logger
 
 
@@ -13,27 +27,144 @@ class LdaModel:
 
     This class contains functions for creating, managing and evaluating topic models.
     Calculations and evaluations are made with gensim.
+    In streaming mode the dictionary is built chunk by chunk and the bag-of-words corpus is serialised
+    to a Matrix Market file, which is read from disk during training instead of being held in memory.
+    With a cache folder the dictionary, the corpus and the tf-idf model are saved under a fingerprint of the
+    text and the dictionary settings, and loaded on the next run instead of being built again; the cached
+    corpus is memory-mapped in both modes.
 
     Attributes:
-        text: a list of preprocessed text
+        text: a list of preprocessed text or an EncodedCorpus
+        streaming: build the corpus on disk instead of in memory
+        corpus_path: path of the Matrix Market file in streaming mode; by default a temporary file, which is removed
+            together with the model (pass a path to keep the corpus, e.g. for a pickled model)
+        chunksize: number of documents added to the dictionary at once
+        cache_dir: folder in which dictionary and corpus are cached between runs, e.g. data/modeling/cache/corpus
+        filter_extremes: keyword arguments of Dictionary.filter_extremes; None keeps all tokens
+        tfidf: weight the corpus with tf-idf instead of token counts
     """
-    def __init__(self, text:list) -> None:
+    def __init__(self, text:list, streaming:bool=False, corpus_path:str=None, chunksize:int=10000, cache_dir:str=None,
+                 filter_extremes:dict=None, tfidf:bool=False) -> None:
         logger.info('Initialize model; create dictionary and corpus...')
         self._text = text
-        self._dictionary = corpora.Dictionary(self._text) # create a dictionary/id2word
-        self._corpus = [self._dictionary.doc2bow(text) for text in self._text] # create a corpus
+        path = None
+        if cache_dir is not None:
+            path = os.path.join(cache_dir, self.fingerprint(text, {'filter_extremes': filter_extremes, 'tfidf': tfidf}))
+        if path is None or not os.path.isdir(path):
+            self._dictionary, documents, self._tfidf = self._prepare_corpus(text, chunksize, filter_extremes, tfidf)
+            if path is not None:
+                self._save_artifacts(path, self._dictionary, documents, self._tfidf)
+            elif streaming:
+                if corpus_path is None:
+                    corpus_directory = tempfile.mkdtemp()
+                    weakref.finalize(self, shutil.rmtree, corpus_directory, True)
+                    corpus_path = os.path.join(corpus_directory, 'corpus.mm')
+                self._corpus = self._serialize_corpus(documents, self._dictionary, corpus_path)
+            else:
+                self._corpus = list(documents) # create a corpus
+        if path is not None:
+            logger.info(f'load dictionary and corpus from {path}...')
+            self._dictionary, self._corpus, self._tfidf = self._load_artifacts(path)
         self._model = None
         self._seed = int(time.time())
 
-    def build(self, seed:int=None, **kwargs):
+    @staticmethod
+    def fingerprint(text, settings:dict):
+        """Returns a hash of the texts and the dictionary settings."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps(settings, sort_keys=True).encode())
+        if isinstance(text, EncodedCorpus):
+            h.update('\x00'.join(text.vocabulary).encode('utf-8') + b'\x01')
+            h.update(text.token_ids.tobytes())
+            h.update(text.offsets.tobytes())
+        else:
+            for document in text:
+                h.update('\x00'.join(document).encode('utf-8') + b'\x01')
+        return h.hexdigest()
+
+    @staticmethod
+    def _prepare_corpus(text, chunksize:int=10000, filter_extremes:dict=None, tfidf:bool=False):
+        # first pass: dictionary; the bag-of-words documents are generated lazily in a second pass
+        if isinstance(text, EncodedCorpus):
+            # token ids are already assigned, no need to hash the tokens again
+            dictionary = corpora.Dictionary.from_corpus((text.bow(i) for i in range(len(text))), id2word=dict(enumerate(text.vocabulary)))
+        else:
+            dictionary = corpora.Dictionary() # create a dictionary/id2word
+            documents = iter(text)
+            for chunk in iter(lambda: list(itertools.islice(documents, chunksize)), []):
+                dictionary.add_documents(chunk)
+        if filter_extremes is not None:
+            dictionary.filter_extremes(**filter_extremes) # assigns new token ids
+        if isinstance(text, EncodedCorpus) and filter_extremes is None:
+            documents = (text.bow(i) for i in range(len(text)))
+        else:
+            documents = (dictionary.doc2bow(document) for document in text)
+        tfidf_model = None
+        if tfidf:
+            tfidf_model = models.TfidfModel(dictionary=dictionary)
+            documents = (tfidf_model[document] for document in documents)
+        return dictionary, documents, tfidf_model
+
+    @staticmethod
+    def _serialize_corpus(documents, dictionary, corpus_path:str):
+        # the documents are written to disk one by one
+        logger.info(f'serialise corpus to {corpus_path}...')
+        corpora.MmCorpus.serialize(corpus_path, documents, id2word=dictionary)
+        return corpora.MmCorpus(corpus_path)
+
+    @staticmethod
+    def _save_artifacts(path:str, dictionary, documents, tfidf_model=None):
+        # the corpus is saved as a sparse document-term matrix (csr arrays), which can be memory-mapped;
+        # the folder is renamed when complete, so an interrupted save is never loaded
+        logger.info(f'save dictionary and corpus to {path}...')
+        indices = array('i')
+        values = array('f' if tfidf_model is not None else 'i')
+        indptr = array('q', [0])
+        for document in documents:
+            if document:
+                token_ids, weights = zip(*document)
+                indices.extend(token_ids)
+                values.extend(weights)
+            indptr.append(len(indices))
+        index_dtype = np.int32 if len(indices) < 2**31 else np.int64 # scipy would convert other index types on load
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        os.makedirs(temporary_path, exist_ok=True)
+        dictionary.save(os.path.join(temporary_path, 'dictionary.dict'))
+        if tfidf_model is not None:
+            tfidf_model.save(os.path.join(temporary_path, 'tfidf.model'))
+        np.save(os.path.join(temporary_path, 'indices.npy'), np.frombuffer(indices, dtype=np.int32).astype(index_dtype, copy=False))
+        np.save(os.path.join(temporary_path, 'indptr.npy'), np.frombuffer(indptr, dtype=np.int64).astype(index_dtype, copy=False))
+        np.save(os.path.join(temporary_path, 'data.npy'), np.frombuffer(values, dtype=np.float32 if tfidf_model is not None else np.int32))
+        try:
+            os.replace(temporary_path, path)
+        except OSError: # saved by another process in the meantime
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+    @staticmethod
+    def _load_artifacts(path:str):
+        dictionary = corpora.Dictionary.load(os.path.join(path, 'dictionary.dict'))
+        indices = np.load(os.path.join(path, 'indices.npy'), mmap_mode='r')
+        indptr = np.load(os.path.join(path, 'indptr.npy'), mmap_mode='r')
+        data = np.load(os.path.join(path, 'data.npy'), mmap_mode='r')
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(dictionary)))
+        tfidf_model = None
+        if os.path.isfile(os.path.join(path, 'tfidf.model')):
+            tfidf_model = models.TfidfModel.load(os.path.join(path, 'tfidf.model'))
+        return dictionary, matutils.Sparse2Corpus(matrix, documents_columns=False), tfidf_model
+
+    def build(self, seed:int=None, resume:bool=False, **kwargs):
         """Builds the LDA model.
 
         Calculates an LDA model using gensim.
 
         Args:
             seed (int, optional): can be handed over for reproducibility
+            resume (bool, optional): continue training the current model with kwargs['passes'] further passes
+                instead of calculating a new model; all other parameters of the model are kept
             **kwargs: all common parameters and their values that can be passed to the LdaModel function
         """
+        if resume:
+            return self._resume(kwargs.get('passes', 1))
         if not seed == None:
             self._seed = int(seed)
         logger.info('calculate lda model... (this can take a while)')
@@ -41,6 +172,15 @@ class LdaModel:
                                        random_state=self._seed)
         logger.info(f'Done. Model calculated successfully!')
         return self._model
+
+    def _resume(self, passes:int):
+        # online lda: the model is updated with further passes over the corpus
+        model = self.model
+        logger.info(f'continue training lda model for {passes} passes...')
+        model.passes = passes
+        model.update(self._corpus)
+        logger.info('Done. Model updated successfully!')
+        return model
     
     # getter & setter
     def __get_text(self):
@@ -51,12 +191,18 @@ class LdaModel:
 
     def __get_corpus(self):
         return self._corpus
+
+    def __get_tfidf(self):
+        return self._tfidf
     
     def __get_model(self):
         if self._model is not None:
             return self._model
         else:
             raise ModelNotBuildError
+
+    def __set_model(self, v):
+        self._model = v
         
     def __get_seed(self):
         return self._seed
@@ -67,7 +213,8 @@ class LdaModel:
     text = property(__get_text)
     dictionary = property(__get_dictionary)
     corpus = property(__get_corpus)
-    model = property(__get_model)
+    tfidf = property(__get_tfidf)
+    model = property(__get_model, __set_model)
     seed = property(__get_seed, __set_seed)
 
 class LdaMulticoreModel(LdaModel):
@@ -76,22 +223,34 @@ class LdaMulticoreModel(LdaModel):
     In contrast to the super class, uses several CPU cores to calculate LDA models
 
     Attributes:
-        text: a list of preprocessed text
+        text: a list of preprocessed text or an EncodedCorpus
+        streaming: build the corpus on disk instead of in memory
+        corpus_path: path of the Matrix Market file in streaming mode; by default a temporary file, which is removed
+            together with the model (pass a path to keep the corpus, e.g. for a pickled model)
+        chunksize: number of documents added to the dictionary at once
+        cache_dir: folder in which dictionary and corpus are cached between runs
+        filter_extremes: keyword arguments of Dictionary.filter_extremes; None keeps all tokens
+        tfidf: weight the corpus with tf-idf instead of token counts
     """
-    def __init__(self, text:list) -> None:
-        super().__init__(text)
+    def __init__(self, text:list, streaming:bool=False, corpus_path:str=None, chunksize:int=10000, cache_dir:str=None,
+                 filter_extremes:dict=None, tfidf:bool=False) -> None:
+        super().__init__(text, streaming, corpus_path, chunksize, cache_dir, filter_extremes, tfidf)
         logger.info('enable multiprocessing...')
         self.cores = multiprocessing.cpu_count()-1 # max number of processor cores that can be used for the calculations
 
-    def build(self, seed:int=None, **kwargs):
+    def build(self, seed:int=None, resume:bool=False, **kwargs):
         """Builds the LDA model.
 
         Calculates an LDA model using gensim and multicore.
 
         Args:
             seed (int, optional): can be handed over for reproducibility
+            resume (bool, optional): continue training the current model with kwargs['passes'] further passes
+                instead of calculating a new model; all other parameters of the model are kept
             **kwargs: all common parameters and their values that can be passed to the LdaModel function
         """
+        if resume:
+            return self._resume(kwargs.get('passes', 1))
         if not seed == None:
             self._seed = int(seed)
         logger.info('calculate lda model...')
@@ -102,21 +261,133 @@ class LdaMulticoreModel(LdaModel):
         return self._model
 
 
-def evaluate(model, text, dictionary):
+def evaluate(model, text, dictionary, scorer:CoherenceScorer=None, processes:int=-1):
     """Evaluates existing LDA models
 
     Calculates metrics that can help evaluate LDA models.
+    If several models of the same text are evaluated, a CoherenceScorer can be handed over,
+    which counts the word co-occurrences of the text only once.
 
     Args:
         model (gensim.models.LdaModel): Lda Model
         text (list): text used to create the model
         dictionary (dict): dictionary used to create the model
+        scorer (CoherenceScorer, optional): precomputed coherence statistics of text and dictionary
+        processes (int, optional): number of processes of the CoherenceModel without scorer; -1 uses all cores but one
     """
     logger.info('calculate coherence score...')
     # calculate coherence score
-    coherence_model = models.coherencemodel.CoherenceModel(model=model, texts=text, dictionary=dictionary, 
-                                                            coherence='c_v')
-    coherence_score = coherence_model.get_coherence()
-    del coherence_model # reclaim memory
+    if scorer is not None:
+        coherence_score = scorer.score(model)
+    else:
+        coherence_model = models.coherencemodel.CoherenceModel(model=model, texts=text, dictionary=dictionary, 
+                                                                coherence='c_v', processes=processes)
+        coherence_score = coherence_model.get_coherence()
+        del coherence_model # reclaim memory
     logger.info(f'Done. Coherence score calculated successfully! Score: {coherence_score}')
-    return coherence_score
\ No newline at end of file
+    return coherence_score
+
+def infer_topics(model, corpus, minimum_probability:float=0.01, chunksize:int=2000, workers:int=1):
+    """Infers the topic distributions of all documents of a corpus.
+
+    Instead of calling get_document_topics for every document, the variational E-step of gensim's inference
+    is run for a whole chunk of documents at once on its sparse document-term matrix, optionally in several
+    processes. The updates, the random initialisation and the convergence check (gamma_threshold) are those of
+    gensim, so the results agree with get_document_topics as far as two calls of it agree with each other.
+    A cached corpus (see LdaModel) is sliced into chunks directly.
+
+    Args:
+        model (gensim.models.LdaModel): Lda Model
+        corpus (iterable): documents in bag-of-words format, e.g. LdaModel.corpus
+        minimum_probability (float, optional): topics with a lower probability are left out of the matrix
+        chunksize (int, optional): number of documents inferred at once
+        workers (int, optional): number of processes; 1 infers the topics in the current process
+
+    Returns:
+        doc_topics (scipy.sparse.csr_matrix): documents x topics matrix of the topic probabilities >= minimum_probability
+        assignments (np.ndarray): most likely topic of each document; -1 if no topic reaches minimum_probability
+    """
+    minimum_probability = max(minimum_probability, 1e-8) # like gensim, never allow zero values in sparse output
+    rows, columns, values = [], [], []
+    number_of_documents = 0
+    logger.info('infer topics of the documents...')
+    for theta in _iter_chunk_topics(model, corpus, chunksize, workers):
+        chunk_rows, chunk_columns = np.nonzero(theta >= minimum_probability)
+        rows.append(chunk_rows + number_of_documents)
+        columns.append(chunk_columns)
+        values.append(theta[chunk_rows, chunk_columns])
+        number_of_documents += len(theta)
+    if not rows:
+        return sparse.csr_matrix((0, model.num_topics), dtype=model.dtype), np.empty(0, dtype=np.int64)
+    doc_topics = sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                                   shape=(number_of_documents, model.num_topics))
+    assignments = np.asarray(doc_topics.argmax(axis=1)).ravel()
+    assignments[np.diff(doc_topics.indptr) == 0] = -1
+    logger.info(f'Done. Topics of {number_of_documents} documents inferred successfully!')
+    return doc_topics, assignments
+
+
+def _iter_chunks(corpus, chunksize:int, num_terms:int):
+    # chunks as sparse documents x terms matrices
+    if isinstance(corpus, matutils.Sparse2Corpus):
+        matrix = corpus.sparse.T.tocsr()
+        for start in range(0, matrix.shape[0], chunksize):
+            yield matrix[start:start + chunksize]
+    else:
+        for chunk in utils.grouper(corpus, chunksize):
+            yield matutils.corpus2csc(chunk, num_terms=num_terms, num_docs=len(chunk)).T.tocsr()
+
+
+def _iter_chunk_topics(model, corpus, chunksize:int, workers:int):
+    chunks = _iter_chunks(corpus, chunksize, model.num_terms)
+    if workers <= 1:
+        for chunk in chunks:
+            yield _chunk_topics(model, chunk)
+        return
+    # at most two chunks per process are waiting, so the corpus is never held in memory as a whole
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_inference_worker, initargs=(model,)) as executor:
+        futures = deque()
+        for chunk in chunks:
+            futures.append(executor.submit(_infer_chunk, chunk))
+            if len(futures) >= 2 * workers:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def _chunk_topics(model, chunk):
+    # gensim's LdaModel.inference for all documents (rows) of the chunk at once; like gensim, a document
+    # is no longer updated as soon as its gamma has converged
+    gamma = model.random_state.gamma(100., 1. / 100., (chunk.shape[0], model.num_topics)).astype(model.dtype, copy=False)
+    exp_elog_theta = np.exp(matutils.dirichlet_expectation(gamma))
+    exp_elog_beta = model.expElogbeta
+    epsilon = np.finfo(model.dtype).eps
+    active = np.arange(chunk.shape[0])
+    documents = chunk
+    for _ in range(model.iterations):
+        # phinorm of every (document, word) entry of the chunk
+        rows = np.repeat(np.arange(len(active)), np.diff(documents.indptr))
+        phinorm = np.einsum('ik,ki->i', exp_elog_theta[active][rows], exp_elog_beta[:, documents.indices]) + epsilon
+        ratios = sparse.csr_matrix(((documents.data / phinorm).astype(model.dtype, copy=False), documents.indices, documents.indptr),
+                                   shape=documents.shape)
+        last_gamma = gamma[active]
+        new_gamma = model.alpha + exp_elog_theta[active] * (ratios @ exp_elog_beta.T)
+        gamma[active] = new_gamma
+        exp_elog_theta[active] = np.exp(matutils.dirichlet_expectation(new_gamma))
+        converged = np.mean(np.abs(new_gamma - last_gamma), axis=1) < model.gamma_threshold
+        if converged.all():
+            break
+        active = active[~converged]
+        documents = documents[~converged]
+    return gamma / gamma.sum(axis=1, keepdims=True) # normalize distributions
+
+
+_inference_model = None # model of a worker process of infer_topics
+
+def _init_inference_worker(model):
+    global _inference_model
+    _inference_model = model
+
+
+def _infer_chunk(chunk):
+    return _chunk_topics(_inference_model, chunk)
@@ -1,8 +1,6 @@
 import pickle
 import logging
 
-from tqdm import tqdm
-
 
 class Logger:
     """
@@ -67,26 +65,25 @@ def load_pkl(path):
         return objs[0]
     
 
-def tweet_topic_assignment(lda_model, topic_minimum_probability:float=0.4):
+def tweet_topic_assignment(lda_model, topic_minimum_probability:float=0.4, workers:int=1):
     """Assigns one or more topics to each tweet
 
-    Iterate over each document in the corpus and assign it the most likely topic.
+    Infers the topic distributions of all documents in the corpus in chunks (see topic_modeling.infer_topics)
+    and assigns each document the topics with a sufficient probability.
 
     Args:
         lda_model (topic_modeling.LdaModel): lda modell
         topic_minimum_probability (float): percentage match with a topic
+        workers (int, optional): number of processes used for the inference
 
     Returns:
         topics (list): List of assigned topics
     """
-    topics = []
-    for doc in tqdm(lda_model.corpus, total=len(lda_model.corpus)):
-        doc_topics = lda_model.model.get_document_topics(doc, minimum_probability=topic_minimum_probability)
-        # check if a topic was found with sufficient probability (minimum_probability)
-        if doc_topics:
-            doc_topics = [int(_[0]) for _ in doc_topics] # transform to list of topics
-        else:
-            doc_topics = None
-        topics.append(doc_topics)
-    
-    return topics
\ No newline at end of file
+    from src.models.topic_modeling import infer_topics # avoid circular import
+
+    doc_topics, _ = infer_topics(lda_model.model, lda_model.corpus, minimum_probability=topic_minimum_probability, workers=workers)
+    # the topics of a document are the column indices of its row; None if no topic was found with sufficient probability
+    indptr = doc_topics.indptr.tolist()
+    topics = [doc_topics.indices[start:end].tolist() or None for start, end in zip(indptr[:-1], indptr[1:])]
+
+    return topics
@@ -0,0 +1,52 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+import pytest
+from hyperopt import hp
+from threadpoolctl import threadpool_info
+
+from src.models import bayesian_optimization as bo
+from src.models import topic_modeling as tm
+
+
+@pytest.fixture
+def path_tweets_processed(tmp_path):
+    rng = np.random.default_rng(0)
+    words = [f'word{i}' for i in range(30)]
+    text = [list(rng.choice(words, size=12)) for _ in range(40)]
+    path = tmp_path / 'tweets_processed.feather'
+    pd.DataFrame({'preprocessed_text': text}).to_feather(path)
+    return str(path)
+
+
+def _trial_resources():
+    blas_threads = [pool['num_threads'] for pool in threadpool_info() if pool['user_api'] == 'blas']
+    return bo._trial_model.cores, blas_threads, bo._trial_scorer is not None
+
+
+def _gensim_coherence_model(*args, **kwargs):
+    raise AssertionError('a trial must not start a CoherenceModel with its own processes')
+
+
+def test_parallel_trials_are_limited_to_their_cores(path_tweets_processed, monkeypatch):
+    # the workers are forked, so they inherit the patched CoherenceModel
+    monkeypatch.setattr(tm.models.coherencemodel, 'CoherenceModel', _gensim_coherence_model)
+    cores = 2
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork'), initializer=bo._init_trial_worker,
+                             initargs=(path_tweets_processed, cores)) as executor:
+        model_cores, blas_threads, has_scorer = executor.submit(_trial_resources).result()
+        seed, cs, _ = executor.submit(bo._run_trial, {'num_topics': 2, 'passes': 1}, 1).result()
+
+    assert model_cores == cores
+    assert blas_threads and all(threads == cores for threads in blas_threads)
+    assert has_scorer
+    assert seed == 1 and np.isfinite(cs)
+
+
+def test_successive_halving_needs_a_range_of_passes(path_tweets_processed):
+    search_space = {'num_topics': hp.choice('num_topics', [2, 3])}
+
+    with pytest.raises(ValueError):
+        bo.optimize_topic_modeling_successive_halving(path_tweets_processed, search_space, n_candidates=3, max_passes=1)
@@ -0,0 +1,61 @@
+import json
+import os
+import shutil
+
+from src.data import checkpoint as checkpoint_module
+from src.data.checkpoint import Checkpoint
+
+
+def test_commits_are_appended_to_the_journal(tmp_path, monkeypatch):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = Checkpoint(path, params={'q': 'ChatGPT'})
+    checkpoint.commit('2023-01-01', 20, cursor='a')
+
+    written_files = []
+    monkeypatch.setattr(checkpoint_module, 'write_json_atomic', lambda path, obj: written_files.append(path))
+    checkpoint.commit('2023-01-01', 20, cursor='b')
+    checkpoint.commit('2023-01-02', 5, complete=True)
+    assert written_files == []
+    monkeypatch.undo()
+
+    reopened_checkpoint = Checkpoint(path)
+    assert reopened_checkpoint.params == {'q': 'ChatGPT'}
+    assert reopened_checkpoint.progress('2023-01-01') == (40, 'b')
+    assert reopened_checkpoint.completed_partitions == ['2023-01-02']
+    assert reopened_checkpoint.num_tweets == 45
+
+
+def test_incomplete_journal_line_is_ignored(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = Checkpoint(path)
+    checkpoint.commit('2023-01-01', 20, cursor='a')
+    with open(checkpoint.journal_path, 'a') as f:
+        f.write('{"partition": "2023-01-01", "tweets": 4') # interrupted commit
+
+    reopened_checkpoint = Checkpoint(path)
+    assert reopened_checkpoint.progress('2023-01-01') == (20, 'a')
+    reopened_checkpoint.commit('2023-01-01', 20, cursor='b')
+    assert Checkpoint(path).progress('2023-01-01') == (40, 'b')
+    assert Checkpoint(path).num_tweets == 40
+
+
+def test_journal_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(Checkpoint, 'COMPACT_INTERVAL', 10)
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = Checkpoint(path)
+    for i in range(25):
+        checkpoint.commit(f'2023-01-{i % 3 + 1:02d}', 1, cursor=i)
+    with open(checkpoint.journal_path) as f:
+        assert len(f.readlines()) == 5
+
+    # an interrupted compaction leaves the journal next to the new checkpoint file
+    shutil.copy(checkpoint.journal_path, tmp_path / 'journal')
+    checkpoint.compact()
+    assert not os.path.isfile(checkpoint.journal_path)
+    shutil.copy(tmp_path / 'journal', checkpoint.journal_path)
+
+    reopened_checkpoint = Checkpoint(path)
+    assert reopened_checkpoint.num_tweets == 25
+    assert reopened_checkpoint.progress('2023-01-01') == (9, 24)
+    with open(path) as f:
+        assert json.load(f)['tweets'] == 25
@@ -0,0 +1,62 @@
+import datetime
+import os
+
+import pytest
+
+from src.data import nitter_scraper_standalone_v2 as nitter
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+@pytest.fixture
+def search_page():
+    # search page as served by nitter: timeline items with the classes 'timeline-item ' (trailing space),
+    # 'timeline-item thread' and 'timeline-item thread-last', a 'load newest' link and a 'show-more ' cursor link
+    with open(os.path.join(FIXTURES, 'nitter_search_page.html'), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('html_parser', ['lxml', 'html.parser'])
+def test_fast_parser_finds_the_tweets_of_the_slow_parser(search_page, html_parser, monkeypatch):
+    if html_parser == 'lxml':
+        pytest.importorskip('lxml')
+    monkeypatch.setattr(nitter, 'HTML_PARSER', html_parser)
+
+    fast_tweets, fast_failures = nitter.parse_nitter_page(search_page, fast_parser=True)
+    slow_tweets, slow_failures = nitter.parse_nitter_page(search_page, fast_parser=False)
+
+    assert fast_tweets == slow_tweets
+    assert fast_failures == slow_failures == 0
+    assert [tweet.url for tweet in fast_tweets] == [
+        'https://twitter.com/alice_ml/status/1609668400000000001#m',
+        'https://twitter.com/bob/status/1609668300000000002#m',
+        'https://twitter.com/carol/status/1609668200000000003#m',
+        'https://twitter.com/dave/status/1609668100000000004#m',
+    ]
+    assert fast_tweets[1].rawContent == 'ChatGPT wrote my unit tests & they even pass'
+    assert fast_tweets[1].date == 'Jan 1, 2023 · 11:58 PM UTC'
+
+
+def test_http_source_follows_the_cursor_of_a_nitter_page(search_page, monkeypatch):
+    source = nitter.HttpNitterSource(base_url='https://nitter.example', ratelimit=0, fallback=False)
+    next_page_url = source._next_page_url(search_page)
+    assert next_page_url.startswith('https://nitter.example/search?f=tweets&q=ChatGPT+lang%3Aen')
+    assert next_page_url.endswith('&cursor=DAADDAABCgABFnKx7zZXQAEKAAIWcrDjJ5ZAAQAIAAIAAAACCAADAAAAAAgABAAAAAAKAAUWcrHvVEAnEAoABhZyse9UP9jwAAA')
+
+    # the last page of a search has no cursor link
+    start = search_page.index('<div class="show-more ">')
+    end = search_page.index('</div>', start) + len('</div>')
+    last_page = search_page[:start] + '<h2 class="timeline-end">No more items</h2>' + search_page[end:]
+    fetched_urls = []
+    def fetch(url):
+        fetched_urls.append(url)
+        return search_page if len(fetched_urls) == 1 else last_page
+    monkeypatch.setattr(source, 'fetch', fetch)
+
+    since = datetime.datetime(2023, 1, 1)
+    pages = list(source.iter_pages('ChatGPT%20lang%3Aen', since, since + datetime.timedelta(days=1)))
+
+    assert fetched_urls[1] == next_page_url
+    assert [len(tweets) for tweets, _ in pages] == [4, 4]
+    assert [cursor for _, cursor in pages] == [next_page_url, None]
@@ -0,0 +1,36 @@
+import datetime
+import os
+import shutil
+
+import pytest
+
+from src.data.nitter_scraper_standalone_v2 import TweetScraper
+from src.data.sources import ReplaySource, benchmark
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+SINCE = datetime.datetime(2023, 1, 1)
+UNTIL = datetime.datetime(2023, 1, 2)
+
+
+@pytest.fixture
+def recorded_pages(tmp_path):
+    for i in range(3):
+        shutil.copy(os.path.join(FIXTURES, 'nitter_search_page.html'), tmp_path / f'page_{i}.html')
+    return tmp_path
+
+
+def test_benchmark_counts_the_tweets_of_recorded_nitter_pages(recorded_pages):
+    source = ReplaySource(str(recorded_pages), TweetScraper.parse_tweets)
+
+    result = benchmark(source, 'ChatGPT', SINCE, UNTIL, batch_size=5)
+
+    assert result['tweets'] == 12
+    assert result['tweets_per_second'] > 0
+
+
+def test_benchmark_fails_if_no_tweets_are_parsed(recorded_pages):
+    source = ReplaySource(str(recorded_pages), lambda content: [])
+
+    with pytest.raises(ValueError):
+        benchmark(source, 'ChatGPT', SINCE, UNTIL)
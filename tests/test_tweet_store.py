@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from src.data import tweet_store
+from src.data.nitter_scraper_standalone_v2 import Tweet
+from src.data.tweet_store import TweetStore
+
+
+def _tweets(day:int, n:int=20):
+    return [Tweet(f'https://twitter.com/user/status/{day * 1000 + i}', f'2023-01-{day + 1:02d}', f'tweet {i}') for i in range(n)]
+
+
+def _segment_files(path):
+    return sorted(file_name for file_name in os.listdir(path) if file_name.endswith('.arrow'))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TweetStore(str(tmp_path / 'store'))
+    for day in range(10):
+        for _ in range(5):
+            store.append(_tweets(day), label=f'2023-01-{day + 1:02d}')
+    return store
+
+
+def test_compact_merges_small_segments(store):
+    table = store.to_table()
+    assert len(_segment_files(store.path)) == 50
+
+    store.compact(segment_rows=300)
+
+    assert len(_segment_files(store.path)) == 4
+    assert [segment['rows'] for segment in store.segments] == [300, 300, 300, 100]
+    assert store.segments[0]['label'] == '2023-01-01,2023-01-02,2023-01-03'
+    assert not os.path.isfile(os.path.join(store.path, TweetStore.JOURNAL))
+    assert TweetStore(store.path).to_table().equals(table)
+
+
+def test_appends_after_compact_are_kept(store):
+    other_store = TweetStore(store.path)
+    store.compact(segment_rows=300)
+
+    other_store.append(_tweets(10), label='2023-01-11')
+    store.append(_tweets(11), label='2023-01-12')
+
+    assert TweetStore(store.path).num_rows == 1040
+    store.compact(segment_rows=300)
+    assert TweetStore(store.path).num_rows == 1040
+    assert len(_segment_files(store.path)) == 4
+
+
+def test_interrupted_compact_lists_every_tweet_once(store, monkeypatch):
+    table = store.to_table()
+    def remove(path):
+        raise KeyboardInterrupt # interrupted after the new manifest has been written
+    monkeypatch.setattr(tweet_store.os, 'remove', remove)
+    with pytest.raises(KeyboardInterrupt):
+        store.compact(segment_rows=300)
+    monkeypatch.undo()
+
+    reopened_store = TweetStore(store.path)
+    assert reopened_store.to_table().equals(table)
+    reopened_store.append(_tweets(10))
+    assert TweetStore(store.path).num_rows == 1020